@@ -4,18 +4,44 @@
 # Copyright (C) 2025 kirey-arch
 # Liccensed under the GNU GPL v3. See LICENSE for more information
 
+import abc
+import argparse
+import asyncio
+import atexit
+import cProfile
+import dbm
+import fcntl
+import functools
 import subprocess
 import shutil
 import os
 import sys
 import json
 import re
+import heapq
+import hashlib
+import gzip
+import shlex
+import signal
+import socket
+import socketserver
+import struct
+import http.client
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import tarfile
 import tempfile
 import time
 from datetime import datetime
-from difflib import get_close_matches
+from email.utils import formatdate, parsedate_to_datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, redirect_stdout
+from difflib import SequenceMatcher
 from pathlib import Path
-from typing import List, Optional, Dict, Tuple
+from typing import List, Optional, Dict, Tuple, Set, Union, Iterator
 
 
 class Colors:
@@ -33,29 +59,186 @@ class Colors:
 
 
 class Logger:
+    """buffered, size-rotated log file in plain text or JSON lines"""
     
-    def __init__(self, log_file: str = None):
+    def __init__(self, log_file: str = None, log_format: str = "text", max_bytes: int = 5 * 1024 * 1024,
+                 backup_count: int = 3, buffer_size: int = 64 * 1024, flush_interval: float = 2.0):
         self.log_file = log_file or os.path.expanduser("~/.cache/aur-helper.log")
         os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+        self.log_format = log_format
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.flush)
     
-    def log(self, level: str, message: str):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] {level}: {message}\n"
+    def log(self, level: str, message: str, **fields):
+        now = datetime.now()
+        if self.log_format == "json":
+            log_entry = json.dumps({
+                "time": now.isoformat(timespec="milliseconds"),
+                "level": level,
+                "message": message,
+                **fields
+            }) + "\n"
+        else:
+            log_entry = f"[{now.strftime('%Y-%m-%d %H:%M:%S')}] {level}: {message}\n"
+        
+        with self._lock:
+            self._buffer.append(log_entry)
+            self._buffered += len(log_entry)
+            if self._buffered >= self.buffer_size or time.time() - self._last_flush >= self.flush_interval:
+                self._flush()
+            elif self._timer is None:
+                # quiet processes never reach the next log() call, so the interval is enforced by a timer too
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def flush(self):
+        with self._lock:
+            self._flush()
+    
+    def _flush(self):
+        self._last_flush = time.time()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        data = "".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
         
         try:
             with open(self.log_file, 'a') as f:
-                f.write(log_entry)
+                f.write(data)
+                size = f.tell()
+            if self.max_bytes and size >= self.max_bytes:
+                self._rotate()
         except Exception:
-            pass 
+            pass
+    
+    def _rotate(self):
+        """aur-helper.log -> aur-helper.log.1.gz -> ... -> aur-helper.log.N.gz"""
+        for generation in range(self.backup_count - 1, 0, -1):
+            older = f"{self.log_file}.{generation}.gz"
+            if os.path.exists(older):
+                os.replace(older, f"{self.log_file}.{generation + 1}.gz")
+        
+        if self.backup_count > 0:
+            with open(self.log_file, 'rb') as src, gzip.open(f"{self.log_file}.1.gz.tmp", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(f"{self.log_file}.1.gz.tmp", f"{self.log_file}.1.gz")
+        os.remove(self.log_file)
+    
+    def info(self, message: str, **fields):
+        self.log("INFO", message, **fields)
+    
+    def error(self, message: str, **fields):
+        self.log("ERROR", message, **fields)
+    
+    def warning(self, message: str, **fields):
+        self.log("WARNING", message, **fields)
+
+
+class Profiler:
+    """timing spans around commands and helper phases"""
+    
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.spans = []
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+    
+    @contextmanager
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            yield
+            return
+        
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            self.spans.append({
+                "name": name,
+                "start": round(start - self._origin, 6),
+                "duration": round(time.perf_counter() - start, 6),
+                "depth": depth,
+                "thread": threading.current_thread().name,
+                **attrs
+            })
     
-    def info(self, message: str):
-        self.log("INFO", message)
+    def summary(self) -> Dict[str, dict]:
+        """per-phase count, total and latency percentiles in seconds"""
+        durations = {}
+        for span in self.spans:
+            durations.setdefault(span["name"], []).append(span["duration"])
+        
+        summary = {}
+        for name, values in durations.items():
+            values.sort()
+            summary[name] = {
+                "count": len(values),
+                "total": sum(values),
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1]
+            }
+        return summary
     
-    def error(self, message: str):
-        self.log("ERROR", message)
+    def report(self):
+        summary = self.summary()
+        if not summary:
+            return
+        
+        print(f"\n{Colors.BOLD}{Colors.CYAN}⏱  Profile{Colors.END}")
+        print(f"{Colors.CYAN}{'Phase':<28} {'Calls':>6} {'Total':>9} {'p50':>9} {'p95':>9} {'Max':>9}{Colors.END}")
+        for name, stats in sorted(summary.items(), key=lambda item: -item[1]["total"]):
+            print(f"{name:<28} {stats['count']:>6} {stats['total']:>8.3f}s {stats['p50'] * 1000:>7.1f}ms "
+                  f"{stats['p95'] * 1000:>7.1f}ms {stats['max'] * 1000:>7.1f}ms")
+        
+        # latency histogram per phase in power-of-two millisecond buckets
+        for name in sorted(summary, key=lambda name: -summary[name]["total"]):
+            buckets = Counter()
+            for span in self.spans:
+                if span["name"] == name:
+                    buckets[max(0, int(span["duration"] * 1000)).bit_length()] += 1
+            print(f"\n{Colors.BOLD}{name}{Colors.END}")
+            peak = max(buckets.values())
+            for bucket in sorted(buckets):
+                upper = 2 ** bucket
+                bar = "█" * max(1, round(buckets[bucket] * 30 / peak))
+                print(f"  < {upper:>7}ms {bar} {buckets[bucket]}")
     
-    def warning(self, message: str):
-        self.log("WARNING", message)
+    def export(self, path: str):
+        with open(path, 'w') as f:
+            json.dump({
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "python": sys.version.split()[0],
+                "summary": self.summary(),
+                "spans": self.spans
+            }, f, indent=2)
+
+
+def profiled(name: str):
+    """time an AURHelper method as a profiler span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.span(name):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
 
 
 class Config:
@@ -70,7 +253,41 @@ class Config:
             "backup_before_operations": True,
             "max_search_results": 10,
             "search_cutoff": 0.3,
-            "colors_enabled": True
+            "colors_enabled": True,
+            "pacman_db_path": "/var/lib/pacman",
+            "use_aur_rpc": True,
+            "aur_rpc_url": "https://aur.archlinux.org/rpc/v5",
+            "aur_cache_ttl": 3600,
+            "max_build_jobs": 0,
+            "backup_keep_count": 50,
+            "backup_keep_days": 30,
+            "max_concurrent_queries": 8,
+            "log_format": "text",
+            "log_max_bytes": 5 * 1024 * 1024,
+            "log_backup_count": 3,
+            "daemon_socket": "",
+            "daemon_poll_interval": 1.0,
+            "pacman_conf": "/etc/pacman.conf",
+            "skip_empty_updates": True,
+            "update_plan_max_age": 3600,
+            "parallel_refresh": True,
+            "mirrors": [],
+            "refresh_jobs": 4,
+            "prefetch_downloads": True,
+            "download_jobs": 4,
+            "cache_keep_versions": 3,
+            "cache_keep_uninstalled": 0,
+            "cache_max_size_mb": 0,
+            "orphans_keep_optional": True,
+            "build_cache": True,
+            "build_cache_dir": "~/.cache/aur-helper/build",
+            "fleet_inventory": "~/.config/aur-helper/hosts",
+            "fleet_jobs": 10,
+            "fleet_max_failure_rate": 0.25,
+            "fleet_timeout": 3600,
+            "fleet_remote_command": "aur-helper",
+            "fleet_ssh_options": ["-o", "BatchMode=yes", "-o", "ConnectTimeout=10"],
+            "show_install_plan": True
         }
         self.config = self.load_config()
     
@@ -123,22 +340,2202 @@ class ProgressIndicator:
                 print(f" {Colors.RED}✗{Colors.END}")
 
 
+def parse_desc(text: str) -> Dict[str, List[str]]:
+    """parse a pacman desc file into %FIELD% -> values"""
+    fields = {}
+    key = None
+    for line in text.splitlines():
+        if line.startswith("%") and line.endswith("%") and len(line) > 2:
+            key = line[1:-1]
+            fields[key] = []
+        elif not line:
+            key = None
+        elif key is not None:
+            fields[key].append(line)
+    return fields
+
+
+def dep_name(dep: str) -> str:
+    """strip version constraints / descriptions from a dependency string"""
+    return re.split(r'[<>=:]', dep, 1)[0].strip()
+
+
+def parse_dep(dep: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """(name, operator, version) of a dependency string such as foo>=1.2 or foo>=2:1.2
+    
+    The version keeps its epoch; strip the description of an optdepends
+    entry ("name: description") before parsing it.
+    """
+    match = re.match(r'^([^<>=:\s]+)\s*(?:(<=|>=|<|>|=)\s*(\S+))?', dep.strip())
+    if not match:
+        return dep.strip(), None, None
+    name, op, version = match.groups()
+    return (name, op, version) if op else (name, None, None)
+
+
+def version_satisfies(version: str, op: Optional[str], required: Optional[str]) -> bool:
+    if not op:
+        return True
+    result = vercmp(version, required)
+    return {"=": result == 0, ">=": result >= 0, "<=": result <= 0, ">": result > 0, "<": result < 0}[op]
+
+
+def _rpmvercmp(a: str, b: str) -> int:
+    """segment-wise comparison used by pacman for each part of a version"""
+    if a == b:
+        return 0
+    
+    def isdigit(ch: str) -> bool:
+        return "0" <= ch <= "9"
+    
+    def isalpha(ch: str) -> bool:
+        return "a" <= ch <= "z" or "A" <= ch <= "Z"
+    
+    one = ptr1 = 0
+    two = ptr2 = 0
+    len1, len2 = len(a), len(b)
+    while one < len1 and two < len2:
+        while one < len1 and not (isdigit(a[one]) or isalpha(a[one])):
+            one += 1
+        while two < len2 and not (isdigit(b[two]) or isalpha(b[two])):
+            two += 1
+        if one >= len1 or two >= len2:
+            break
+        
+        # if the separator lengths were different, we are also finished
+        if one - ptr1 != two - ptr2:
+            return -1 if one - ptr1 < two - ptr2 else 1
+        
+        ptr1, ptr2 = one, two
+        is_num = isdigit(a[ptr1])
+        kind = isdigit if is_num else isalpha
+        while ptr1 < len1 and kind(a[ptr1]):
+            ptr1 += 1
+        while ptr2 < len2 and kind(b[ptr2]):
+            ptr2 += 1
+        
+        if two == ptr2:
+            return 1 if is_num else -1
+        
+        seg1, seg2 = a[one:ptr1], b[two:ptr2]
+        if is_num:
+            seg1, seg2 = seg1.lstrip("0"), seg2.lstrip("0")
+            if len(seg1) != len(seg2):
+                return 1 if len(seg1) > len(seg2) else -1
+        if seg1 != seg2:
+            return -1 if seg1 < seg2 else 1
+        
+        one, two = ptr1, ptr2
+    
+    if one >= len1 and two >= len2:
+        return 0
+    # a remaining alpha string never beats an empty one
+    if (one >= len1 and not isalpha(b[two])) or (one < len1 and isalpha(a[one])):
+        return -1
+    return 1
+
+
+def _parse_evr(version: str) -> Tuple[str, str, Optional[str]]:
+    """epoch:pkgver-pkgrel -> (epoch, pkgver, pkgrel)"""
+    epoch = "0"
+    digits = 0
+    while digits < len(version) and version[digits].isdigit():
+        digits += 1
+    if digits < len(version) and version[digits] == ":":
+        epoch = version[:digits] or "0"
+        version = version[digits + 1:]
+    
+    release = None
+    if "-" in version:
+        version, release = version.rsplit("-", 1)
+    return epoch, version, release
+
+
+@functools.lru_cache(maxsize=65536)
+def vercmp(a: str, b: str) -> int:
+    """pure-Python pacman vercmp: -1, 0 or 1"""
+    if a == b:
+        return 0
+    epoch1, version1, release1 = _parse_evr(a)
+    epoch2, version2, release2 = _parse_evr(b)
+    result = _rpmvercmp(epoch1, epoch2)
+    if result == 0:
+        result = _rpmvercmp(version1, version2)
+        if result == 0 and release1 and release2:
+            result = _rpmvercmp(release1, release2)
+    return result
+
+
+def vercmp_batch(pairs: List[Tuple[str, str]]) -> List[int]:
+    return [vercmp(a, b) for a, b in pairs]
+
+
+def parse_package_filename(filename: str) -> Optional[Tuple[str, str, str]]:
+    """(name, version, arch) from a name-pkgver-pkgrel-arch.pkg.tar.* file name"""
+    match = re.match(r'^(.+)-([^-]+-[^-]+)-([^-]+)\.pkg\.tar(\.[a-z0-9]+)?$', filename)
+    if not match:
+        return None
+    return match.group(1), match.group(2), match.group(3)
+
+
+class PacmanConf:
+    """the parts of pacman.conf this tool needs: options and repositories in order"""
+    
+    def __init__(self, path: str = "/etc/pacman.conf"):
+        self.path = path
+        self.architecture = os.uname().machine
+        self.cache_dirs = []
+        self.db_path = "/var/lib/pacman"
+        self.ignore_packages = set()
+        self.ignore_groups = set()
+        self.repos = []
+        self.servers = {}
+        self._parse(path, None)
+        if not self.cache_dirs:
+            self.cache_dirs = ["/var/cache/pacman/pkg"]
+    
+    def _parse(self, path: str, section: Optional[str]) -> Optional[str]:
+        try:
+            with open(path, 'r') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return section
+        
+        for line in lines:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                section = line[1:-1]
+                if section != "options" and section not in self.servers:
+                    self.repos.append(section)
+                    self.servers[section] = []
+                continue
+            
+            key, _, value = (part.strip() for part in line.partition("="))
+            if section == "options":
+                if key == "Architecture" and value and value != "auto":
+                    self.architecture = value.split()[0]
+                elif key == "CacheDir":
+                    self.cache_dirs.append(value)
+                elif key == "DBPath":
+                    self.db_path = value
+                elif key == "IgnorePkg":
+                    self.ignore_packages.update(value.split())
+                elif key == "IgnoreGroup":
+                    self.ignore_groups.update(value.split())
+            elif section is not None:
+                if key == "Server":
+                    self.servers[section].append(value)
+                elif key == "Include":
+                    self._parse_include(value, section)
+        return section
+    
+    def _parse_include(self, path: str, section: str):
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    key, _, value = (part.strip() for part in line.split("#", 1)[0].partition("="))
+                    if key == "Server" and value:
+                        self.servers[section].append(value)
+        except OSError:
+            pass
+    
+    def server_urls(self, repo: str) -> List[str]:
+        return [
+            server.replace("$repo", repo).replace("$arch", self.architecture)
+            for server in self.servers.get(repo, [])
+        ]
+
+
+class LocalDatabase:
+    """in-process reader for the pacman local database"""
+    
+    def __init__(self, db_path: str = "/var/lib/pacman"):
+        self.local_dir = os.path.join(db_path, "local")
+        self._mtime = None
+        self._packages = {}
+        self._names = frozenset()
+        self._graph = None
+    
+    def available(self) -> bool:
+        return os.path.isdir(self.local_dir)
+    
+    def packages(self) -> Dict[str, dict]:
+        """name -> metadata map, re-read only when the directory changes"""
+        try:
+            mtime = os.stat(self.local_dir).st_mtime_ns
+        except OSError:
+            return {}
+        
+        if mtime != self._mtime:
+            self._packages = self._load()
+            self._names = frozenset(self._packages)
+            self._graph = None
+            self._mtime = mtime
+        return self._packages
+    
+    def names(self) -> Set[str]:
+        self.packages()
+        return self._names
+    
+    def graph(self) -> "DependencyGraph":
+        """dependency graph of the installed packages, rebuilt with the package map"""
+        packages = self.packages()
+        if self._graph is None:
+            self._graph = DependencyGraph(packages)
+        return self._graph
+    
+    def _load(self) -> Dict[str, dict]:
+        packages = {}
+        with os.scandir(self.local_dir) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                try:
+                    with open(os.path.join(entry.path, "desc"), 'r', encoding='utf-8', errors='replace') as f:
+                        fields = parse_desc(f.read())
+                except OSError:
+                    continue
+                
+                if "NAME" not in fields:
+                    continue
+                name = fields["NAME"][0]
+                packages[name] = {
+                    "name": name,
+                    "version": fields.get("VERSION", ["unknown"])[0],
+                    "desc": fields.get("DESC", [""])[0],
+                    "size": int(fields.get("SIZE", ["0"])[0] or 0),
+                    # 0 = explicitly installed, 1 = installed as a dependency
+                    "reason": int(fields.get("REASON", ["0"])[0] or 0),
+                    "depends": fields.get("DEPENDS", []),
+                    "optdepends": fields.get("OPTDEPENDS", []),
+                    "provides": fields.get("PROVIDES", []),
+                    "replaces": fields.get("REPLACES", []),
+                    "conflicts": fields.get("CONFLICTS", [])
+                }
+        return packages
+
+
+class DependencyGraph:
+    """resolved forward and reverse dependency edges between installed packages"""
+    
+    def __init__(self, packages: Dict[str, dict]):
+        self.packages = packages
+        providers = {}
+        for name, info in packages.items():
+            for provided in info["provides"]:
+                providers.setdefault(dep_name(provided), []).append(name)
+        
+        def satisfiers(dep: str) -> List[str]:
+            name = dep_name(dep)
+            return [name] if name in packages else providers.get(name, [])
+        
+        self.depends = {}
+        self.optdepends = {}
+        # per package, the installed satisfiers of each of its dependencies
+        self.requirements = {}
+        self.required_by = {name: set() for name in packages}
+        self.optional_for = {name: set() for name in packages}
+        for name, info in packages.items():
+            self.requirements[name] = [frozenset(satisfiers(dep)) for dep in info["depends"]]
+            self.depends[name] = {s for group in self.requirements[name] for s in group if s != name}
+            # "name: reason" entries
+            self.optdepends[name] = {s for dep in info["optdepends"] for s in satisfiers(dep.split(":", 1)[0]) if s != name}
+            for target in self.depends[name]:
+                self.required_by[target].add(name)
+            for target in self.optdepends[name]:
+                self.optional_for[target].add(name)
+    
+    def orphans(self, keep_optional: bool = True) -> List[str]:
+        """dependencies no explicitly installed package needs, directly or transitively
+        
+        This is the full closure `pacman -Qtd` only reaches after repeated
+        removals, including dependency cycles nothing else holds on to.
+        """
+        needed = [name for name, info in self.packages.items() if info["reason"] == 0]
+        seen = set(needed)
+        while needed:
+            name = needed.pop()
+            edges = self.depends[name] | self.optdepends[name] if keep_optional else self.depends[name]
+            for target in edges:
+                if target not in seen:
+                    seen.add(target)
+                    needed.append(target)
+        return sorted(name for name in self.packages if name not in seen)
+    
+    def removal(self, targets: List[str], recursive: bool) -> Dict[str, object]:
+        """what `pacman -R` (or `-Rs` when recursive) would take out, and what it would break"""
+        # pacman refuses the whole transaction over a target that is not installed
+        not_found = [name for name in targets if name not in self.packages]
+        if not_found:
+            return {"remove": [], "freed": 0, "blockers": {}, "optional": {}, "not_found": not_found}
+        
+        removed = set(targets)
+        if recursive:
+            # like -Rs: dependencies installed as dependencies that nothing outside the set needs
+            changed = True
+            while changed:
+                changed = False
+                for name in list(removed):
+                    for dep in self.depends.get(name, ()):
+                        if (dep not in removed and self.packages[dep]["reason"] == 1
+                                and self.required_by[dep] <= removed):
+                            removed.add(dep)
+                            changed = True
+        
+        blockers = {}
+        for name in removed:
+            for dependent in self.required_by.get(name, ()):
+                if dependent in removed:
+                    continue
+                # only broken if no remaining package satisfies the dependency
+                if any(group and group <= removed for group in self.requirements[dependent]):
+                    blockers.setdefault(name, set()).add(dependent)
+        
+        optional = {}
+        for name in removed:
+            users = self.optional_for.get(name, set()) - removed
+            if users:
+                optional[name] = sorted(users)
+        
+        return {
+            "remove": sorted(removed, key=lambda name: (name not in targets, name)),
+            "freed": sum(self.packages[name]["size"] for name in removed),
+            "blockers": {name: sorted(dependents) for name, dependents in sorted(blockers.items())},
+            "optional": optional,
+            "not_found": []
+        }
+
+
+class SyncIndex:
+    """name/provides/replaces index over the pacman sync databases"""
+    
+    INDEX_VERSION = 2
+    
+    def __init__(self, db_path: str = "/var/lib/pacman", index_file: str = None):
+        self.sync_dir = os.path.join(db_path, "sync")
+        self.index_file = index_file or os.path.expanduser("~/.cache/aur-helper/sync_index.json")
+        self.repos = {}
+        self.by_name = {}
+        self.by_provides = {}
+        self.by_replaces = {}
+        self.by_group = {}
+        self._signature = None
+    
+    def available(self) -> bool:
+        return bool(self._db_files())
+    
+    def _db_files(self) -> Dict[str, str]:
+        try:
+            with os.scandir(self.sync_dir) as entries:
+                return {
+                    entry.name[:-3]: entry.path
+                    for entry in entries
+                    if entry.name.endswith(".db") and entry.is_file()
+                }
+        except OSError:
+            return {}
+    
+    def refresh(self):
+        """re-read only the sync databases whose mtime changed"""
+        db_files = self._db_files()
+        signature = {}
+        for repo, path in db_files.items():
+            try:
+                signature[repo] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+        
+        if signature == self._signature:
+            return
+        
+        if self._signature is None:
+            self.repos = self._load_index()
+        
+        changed = False
+        for repo in list(self.repos):
+            if repo not in signature:
+                del self.repos[repo]
+                changed = True
+        
+        for repo, mtime in signature.items():
+            cached = self.repos.get(repo)
+            if cached and cached.get("mtime") == mtime:
+                continue
+            packages = self._read_db(repo, db_files[repo])
+            if packages is None:
+                continue
+            self.repos[repo] = {"mtime": mtime, "packages": packages}
+            changed = True
+        
+        if changed:
+            self._save_index()
+        self._build_maps()
+        self._signature = signature
+    
+    def _read_db(self, repo: str, path: str) -> Optional[Dict[str, dict]]:
+        packages = {}
+        try:
+            with tarfile.open(path, 'r:*') as tar:
+                for member in tar:
+                    if not member.isfile() or not member.name.endswith("/desc"):
+                        continue
+                    f = tar.extractfile(member)
+                    if f is None:
+                        continue
+                    fields = parse_desc(f.read().decode('utf-8', errors='replace'))
+                    if "NAME" not in fields:
+                        continue
+                    name = fields["NAME"][0]
+                    packages[name] = {
+                        "name": name,
+                        "repo": repo,
+                        "base": fields.get("BASE", [name])[0],
+                        "version": fields.get("VERSION", ["unknown"])[0],
+                        "desc": fields.get("DESC", [""])[0],
+                        "filename": fields.get("FILENAME", [""])[0],
+                        "csize": int(fields.get("CSIZE", ["0"])[0] or 0),
+                        "isize": int(fields.get("ISIZE", ["0"])[0] or 0),
+                        "sha256": fields.get("SHA256SUM", [""])[0],
+                        "depends": fields.get("DEPENDS", []),
+                        "optdepends": fields.get("OPTDEPENDS", []),
+                        "provides": fields.get("PROVIDES", []),
+                        "replaces": fields.get("REPLACES", []),
+                        "conflicts": fields.get("CONFLICTS", []),
+                        "groups": fields.get("GROUPS", [])
+                    }
+        except (OSError, tarfile.TarError, ValueError):
+            return None
+        return packages
+    
+    def _load_index(self) -> Dict[str, dict]:
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == self.INDEX_VERSION:
+                return data.get("repos", {})
+        except Exception:
+            pass
+        return {}
+    
+    def _save_index(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump({"version": self.INDEX_VERSION, "repos": self.repos}, f)
+            os.replace(tmp_file, self.index_file)
+        except Exception:
+            pass
+    
+    def _build_maps(self):
+        self.by_name = {}
+        self.by_provides = {}
+        self.by_replaces = {}
+        self.by_group = {}
+        for repo in sorted(self.repos):
+            for name, entry in self.repos[repo]["packages"].items():
+                self.by_name.setdefault(name, []).append(entry)
+                for provided in entry["provides"]:
+                    self.by_provides.setdefault(dep_name(provided), []).append(entry)
+                for replaced in entry["replaces"]:
+                    self.by_replaces.setdefault(dep_name(replaced), []).append(entry)
+                for group in entry["groups"]:
+                    self.by_group.setdefault(group, []).append(entry)
+    
+    def find(self, name: str) -> List[dict]:
+        """entries whose package name is exactly `name`"""
+        self.refresh()
+        return self.by_name.get(name, [])
+    
+    def providers(self, name: str) -> List[dict]:
+        self.refresh()
+        return self.by_provides.get(name, [])
+    
+    def replacements(self, name: str) -> List[dict]:
+        self.refresh()
+        return self.by_replaces.get(name, [])
+    
+    def group(self, name: str) -> List[dict]:
+        """entries that belong to the package group `name`"""
+        self.refresh()
+        return self.by_group.get(name, [])
+    
+    def exists(self, name: str) -> bool:
+        """installable by name or through a provides entry"""
+        self.refresh()
+        return name in self.by_name or name in self.by_provides
+
+
+class FuzzyMatcher:
+    """trigram-indexed fuzzy matching over package names"""
+    
+    def __init__(self, names: List[str]):
+        self.names = names
+        self.postings = {}
+        for i, name in enumerate(names):
+            for gram in self._grams(name):
+                self.postings.setdefault(gram, []).append(i)
+    
+    @staticmethod
+    def _grams(text: str) -> Set[str]:
+        padded = f"  {text.lower()} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+    
+    def scored(self, query: str, n: int = 10, cutoff: float = 0.3) -> List[Tuple[float, str]]:
+        """top `n` (score, name) pairs scoring at least `cutoff`, best first"""
+        query_grams = self._grams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.postings.get(gram, ()))
+        if not shared:
+            return []
+        
+        # narrow to the names with the best trigram overlap before running
+        # SequenceMatcher, which is the expensive part
+        survivors = heapq.nlargest(
+            max(n * 20, 200),
+            shared.items(),
+            key=lambda item: 2 * item[1] / (len(query_grams) + len(self.names[item[0]]) + 1)
+        )
+        
+        matcher = SequenceMatcher()
+        matcher.set_seq2(query)
+        results = []
+        for i, _ in survivors:
+            name = self.names[i]
+            matcher.set_seq1(name)
+            if (matcher.real_quick_ratio() >= cutoff and
+                    matcher.quick_ratio() >= cutoff):
+                score = matcher.ratio()
+                if score >= cutoff:
+                    results.append((score, name))
+        return heapq.nlargest(n, results)
+    
+    def match(self, query: str, n: int = 10, cutoff: float = 0.3) -> List[str]:
+        return [name for _, name in self.scored(query, n, cutoff)]
+
+
+class PackageRecord:
+    """view of one PackageTable row; reads like the dicts search results used to be"""
+    
+    __slots__ = ("table", "row")
+    FIELDS = ("name", "repo", "version", "description")
+    
+    def __init__(self, table: "PackageTable", row: int):
+        self.table = table
+        self.row = row
+    
+    def __getitem__(self, key: str) -> str:
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self.table, f"{key}s")[self.row]
+    
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def as_dict(self) -> Dict[str, str]:
+        return {key: self[key] for key in self.FIELDS}
+
+
+class PackageTable:
+    """search results stored column-wise, one list per field, addressed by row
+    
+    Repo and version strings are interned, so a 100k row listing holds four
+    list slots per package instead of a dict each.
+    """
+    
+    __slots__ = ("names", "repos", "versions", "descriptions", "rows")
+    
+    def __init__(self, records: Iterator[Tuple[str, str, str, str]] = ()):
+        self.names = []
+        self.repos = []
+        self.versions = []
+        self.descriptions = []
+        self.rows = {}
+        self.extend(records)
+    
+    def append(self, name: str, repo: str, version: str, description: str = "") -> int:
+        """add a row unless the name is already present; returns its row"""
+        row = self.rows.get(name)
+        if row is not None:
+            return row
+        row = self.rows[name] = len(self.names)
+        self.names.append(name)
+        self.repos.append(sys.intern(repo))
+        self.versions.append(sys.intern(version))
+        self.descriptions.append(description)
+        return row
+    
+    def extend(self, records: Iterator[Tuple[str, str, str, str]]):
+        for record in records:
+            self.append(*record)
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self.rows
+    
+    def __getitem__(self, name: str) -> PackageRecord:
+        return PackageRecord(self, self.rows[name])
+    
+    def get(self, name: str, default=None) -> Optional[PackageRecord]:
+        row = self.rows.get(name)
+        return default if row is None else PackageRecord(self, row)
+    
+    def __iter__(self) -> Iterator[PackageRecord]:
+        return (PackageRecord(self, row) for row in range(len(self.names)))
+
+
+class AURClient:
+    """AUR RPC client with pooled keep-alive connections and an on-disk response cache"""
+    
+    # keeps batched info URLs well under the AUR's request line limit
+    MAX_INFO_ARGS = 150
+    
+    def __init__(self, base_url: str = "https://aur.archlinux.org/rpc/v5", cache_dir: str = None,
+                 ttl: int = 3600, timeout: int = 15, pool_size: int = 4):
+        url = urllib.parse.urlsplit(base_url)
+        self.scheme = url.scheme
+        self.netloc = url.netloc
+        self.base_path = url.path.rstrip("/")
+        self.cache_dir = cache_dir or os.path.expanduser("~/.cache/aur-helper/aur")
+        self.ttl = ttl
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._pool = []
+        self._lock = threading.Lock()
+    
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+    
+    def _acquire(self) -> http.client.HTTPConnection:
+        with self._lock:
+            if self._pool:
+                return self._pool.pop()
+        return self._new_connection()
+    
+    def _release(self, conn: http.client.HTTPConnection):
+        with self._lock:
+            if len(self._pool) < self.pool_size:
+                self._pool.append(conn)
+                return
+        conn.close()
+    
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, []
+        for conn in pool:
+            conn.close()
+    
+    def _cache_path(self, path: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(path.encode()).hexdigest() + ".json")
+    
+    def _read_cache(self, path: str) -> Optional[dict]:
+        try:
+            with open(self._cache_path(path), 'r') as f:
+                return json.load(f)
+        except Exception:
+            return None
+    
+    def _write_cache(self, path: str, entry: dict):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            cache_file = self._cache_path(path)
+            tmp_file = f"{cache_file}.{threading.get_ident()}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_file, cache_file)
+        except Exception:
+            pass
+    
+    def _fetch(self, path: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        # one retry covers keep-alive connections the server has since closed
+        for attempt in range(2):
+            conn = self._acquire()
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            return response.status, {k.lower(): v for k, v in response.getheaders()}, body
+    
+    def get(self, endpoint: str, offline: bool = False) -> Optional[dict]:
+        """GET an RPC endpoint, served from cache within the TTL and revalidated by ETag after"""
+        path = f"{self.base_path}{endpoint}"
+        cached = self._read_cache(path)
+        if cached and (offline or time.time() - cached.get("fetched", 0) < self.ttl):
+            return cached["body"]
+        if offline:
+            return None
+        
+        headers = {"Accept": "application/json"}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        
+        try:
+            status, response_headers, body = self._fetch(path, headers)
+        except (http.client.HTTPException, OSError):
+            return cached["body"] if cached else None
+        
+        if status == 304 and cached:
+            cached["fetched"] = time.time()
+            self._write_cache(path, cached)
+            return cached["body"]
+        
+        if status != 200:
+            return cached["body"] if cached else None
+        
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return cached["body"] if cached else None
+        
+        if data.get("type") == "error":
+            return None
+        
+        self._write_cache(path, {
+            "etag": response_headers.get("etag"),
+            "fetched": time.time(),
+            "body": data
+        })
+        return data
+    
+    def info(self, names: List[str], offline: bool = False) -> Optional[Dict[str, dict]]:
+        """name -> AUR info for every name that exists, batched into multi-arg[] requests"""
+        names = sorted(set(names))
+        batches = [names[i:i + self.MAX_INFO_ARGS] for i in range(0, len(names), self.MAX_INFO_ARGS)]
+        endpoints = [
+            "/info?" + urllib.parse.urlencode([("arg[]", name) for name in batch])
+            for batch in batches
+        ]
+        
+        if len(endpoints) > 1 and not offline:
+            with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+                responses = list(executor.map(self.get, endpoints))
+        else:
+            responses = [self.get(endpoint, offline) for endpoint in endpoints]
+        
+        if any(response is None for response in responses):
+            return None
+        
+        results = {}
+        for response in responses:
+            for pkg in response.get("results", []):
+                results[pkg["Name"]] = pkg
+        return results
+    
+    def search(self, query: str, by: str = "name") -> Optional[List[dict]]:
+        endpoint = f"/search/{urllib.parse.quote(query, safe='')}?" + urllib.parse.urlencode({"by": by})
+        response = self.get(endpoint)
+        if response is None:
+            return None
+        return response.get("results", [])
+
+
+class BuildCache:
+    """persistent AUR clones and built packages, safe to share between hosts (e.g. over NFS)"""
+    
+    # their sources move without the PKGBUILD changing, so a build is never reused
+    VCS_SUFFIXES = ("-git", "-svn", "-hg", "-bzr", "-darcs", "-fossil")
+    
+    def __init__(self, cache_dir: str, arch: str):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.arch = arch
+        self.clones_dir = os.path.join(self.cache_dir, "clones")
+        self.artifacts_dir = os.path.join(self.cache_dir, "artifacts")
+        self.locks_dir = os.path.join(self.cache_dir, "locks")
+    
+    def clone_dir(self, base: str) -> str:
+        return os.path.join(self.clones_dir, base)
+    
+    @contextmanager
+    def lock(self, base: str):
+        """exclusive per-pkgbase lock; POSIX record locks also hold across NFS clients"""
+        os.makedirs(self.locks_dir, exist_ok=True)
+        with open(os.path.join(self.locks_dir, f"{base}.lock"), 'a') as f:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(f, fcntl.LOCK_UN)
+    
+    def key(self, base: str, files: List[str]) -> Optional[str]:
+        """hash of the tracked build files (PKGBUILD, .SRCINFO, patches...) and the architecture"""
+        if base.endswith(self.VCS_SUFFIXES):
+            return None
+        clone_dir = self.clone_dir(base)
+        digest = hashlib.sha256(f"{self.arch}\n".encode())
+        for name in sorted(files):
+            try:
+                with open(os.path.join(clone_dir, name), 'rb') as f:
+                    content = f.read()
+            except OSError:
+                return None
+            digest.update(f"{name}\0{len(content)}\0".encode())
+            digest.update(content)
+        return digest.hexdigest()
+    
+    def lookup(self, key: str) -> Optional[List[str]]:
+        entry_dir = os.path.join(self.artifacts_dir, key)
+        try:
+            with open(os.path.join(entry_dir, "manifest.json"), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        paths = [os.path.join(entry_dir, filename) for filename in manifest.get("files", [])]
+        if not paths or not all(os.path.isfile(path) for path in paths):
+            return None
+        return paths
+    
+    def store(self, key: str, base: str, artifacts: List[str]) -> List[str]:
+        """copy built packages into the cache; returns the cached paths"""
+        os.makedirs(self.artifacts_dir, exist_ok=True)
+        entry_dir = os.path.join(self.artifacts_dir, key)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{key}-", dir=self.artifacts_dir)
+        try:
+            for path in artifacts:
+                shutil.copy2(path, tmp_dir)
+            with open(os.path.join(tmp_dir, "manifest.json"), 'w') as f:
+                json.dump({
+                    "base": base,
+                    "arch": self.arch,
+                    "files": [os.path.basename(path) for path in artifacts],
+                    "host": socket.gethostname(),
+                    "time": datetime.now().isoformat(timespec="seconds")
+                }, f, indent=2)
+            # a directory rename is atomic, readers see a complete entry or none
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            cached = self.lookup(key)
+            return cached if cached else artifacts
+        return [os.path.join(entry_dir, os.path.basename(path)) for path in artifacts]
+
+
+class BuildScheduler:
+    """builds AUR packages in parallel, one dependency layer at a time"""
+    
+    def __init__(self, helper: "AURHelper", max_jobs: int = 0, cache: Optional[BuildCache] = None):
+        self.helper = helper
+        self.max_jobs = max_jobs or os.cpu_count() or 1
+        self.cache = cache
+        self.timings = {}
+        self.cached = set()
+    
+    def resolve(self, targets: List[str]) -> Optional[Tuple[Dict[str, dict], Set[str], List[str]]]:
+        """AUR build nodes keyed by pkgbase, the repo packages they need and names missing from the AUR
+        
+        None when the AUR could not be asked at all.
+        """
+        # installed versions and provides, then the repositories, exactly as an install plan resolves them
+        planner = InstallPlanner(self.helper.local_db, self.helper.sync_index, self.helper.pacman_conf)
+        pending = list(dict.fromkeys(targets))
+        seen = set(pending)
+        info = {}
+        repo_deps = set()
+        missing = []
+        
+        while pending:
+            found = self.helper.aur.info(pending)
+            if found is None:
+                return None
+            
+            next_pending = []
+            for name in pending:
+                if name not in found:
+                    missing.append(name)
+                    continue
+                pkg = found[name]
+                info[name] = pkg
+                for dep in pkg.get("Depends", []) + pkg.get("MakeDepends", []) + pkg.get("CheckDepends", []):
+                    kind, value = planner.resolve(dep)
+                    if kind == "installed":
+                        continue
+                    if kind == "repo":
+                        repo_deps.add(value["name"])
+                        continue
+                    if value not in seen:
+                        seen.add(value)
+                        next_pending.append(value)
+            pending = next_pending
+        
+        nodes = {}
+        for name, pkg in info.items():
+            base = pkg.get("PackageBase", name)
+            node = nodes.setdefault(base, {"names": set(), "deps": set()})
+            node["names"].add(name)
+        
+        for name, pkg in info.items():
+            base = pkg.get("PackageBase", name)
+            for dep in pkg.get("Depends", []) + pkg.get("MakeDepends", []) + pkg.get("CheckDepends", []):
+                dep = dep_name(dep)
+                if dep in info:
+                    dep_base = info[dep].get("PackageBase", dep)
+                    if dep_base != base:
+                        nodes[base]["deps"].add(dep_base)
+        
+        return nodes, repo_deps, missing
+    
+    @staticmethod
+    def layers(nodes: Dict[str, dict]) -> Optional[List[List[str]]]:
+        """topological layers; every node only depends on earlier layers"""
+        remaining = {base: set(node["deps"]) for base, node in nodes.items()}
+        layers = []
+        while remaining:
+            ready = sorted(base for base, deps in remaining.items() if not deps)
+            if not ready:
+                return None
+            layers.append(ready)
+            for base in ready:
+                del remaining[base]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return layers
+    
+    def makepkg(self, clone_dir: str, out_dir: str, build_dir: str, sync_deps: bool) -> List[str]:
+        """run makepkg in a checkout, returning the built package files (empty on failure)"""
+        os.makedirs(out_dir, exist_ok=True)
+        success, _ = self.helper.run_command(
+            f"cd {shlex.quote(clone_dir)} && PKGDEST={shlex.quote(out_dir)} "
+            f"BUILDDIR={shlex.quote(build_dir)} makepkg --noconfirm"
+            + (" -s" if sync_deps else "")
+        )
+        if not success:
+            return []
+        return sorted(
+            os.path.join(out_dir, filename)
+            for filename in os.listdir(out_dir)
+            if parse_package_filename(filename)
+        )
+    
+    def build_node(self, base: str, build_dir: str, sync_deps: bool = False) -> Tuple[bool, List[str]]:
+        """clone and build one pkgbase, returning the built package files"""
+        start = time.time()
+        if self.cache is not None:
+            artifacts = self.build_cached(base, build_dir, sync_deps)
+        else:
+            clone_dir = os.path.join(build_dir, base)
+            success, _ = self.helper.run_command(
+                f"git clone https://aur.archlinux.org/{base}.git {shlex.quote(clone_dir)}"
+            )
+            artifacts = self.makepkg(clone_dir, os.path.join(clone_dir, "out"), build_dir, sync_deps) if success else []
+        
+        self.timings[base] = time.time() - start
+        return bool(artifacts), artifacts
+    
+    def build_cached(self, base: str, build_dir: str, sync_deps: bool) -> List[str]:
+        """update the persistent clone, reusing a previous build of the same files"""
+        clone_dir = shlex.quote(self.cache.clone_dir(base))
+        with self.cache.lock(base):
+            if os.path.isdir(os.path.join(self.cache.clone_dir(base), ".git")):
+                success, _ = self.helper.run_command(
+                    f"git -C {clone_dir} fetch -q origin && git -C {clone_dir} reset -q --hard FETCH_HEAD"
+                )
+            else:
+                os.makedirs(self.cache.clones_dir, exist_ok=True)
+                success, _ = self.helper.run_command(f"git clone https://aur.archlinux.org/{base}.git {clone_dir}")
+            if not success:
+                return []
+            
+            success, output = self.helper.run_command(f"git -C {clone_dir} ls-files")
+            key = self.cache.key(base, output.split("\n")) if success and output.strip() else None
+            if key:
+                cached = self.cache.lookup(key)
+                if cached:
+                    self.cached.add(base)
+                    return cached
+            
+            # BUILDDIR keeps src/ and pkg/ on local disk, only downloaded sources land in the clone
+            artifacts = self.makepkg(self.cache.clone_dir(base), os.path.join(build_dir, base, "out"), build_dir, sync_deps)
+            if artifacts and key:
+                artifacts = self.cache.store(key, base, artifacts)
+            return artifacts
+    
+    def install_layer(self, nodes: Dict[str, dict], layer: List[str], artifacts: Dict[str, List[str]],
+                      targets: List[str]) -> bool:
+        files = []
+        as_deps = []
+        for base in layer:
+            for path in artifacts[base]:
+                name = parse_package_filename(os.path.basename(path))[0]
+                if name in nodes[base]["names"]:
+                    files.append(path)
+                    if name not in targets:
+                        as_deps.append(name)
+        
+        cmd = "sudo pacman -U " + " ".join(shlex.quote(path) for path in files)
+        if self.helper.config.get("auto_confirm"):
+            cmd += " --noconfirm"
+        success, _ = self.helper.run_command(cmd, capture_output=False)
+        if success and as_deps:
+            self.helper.run_command(f"sudo pacman -D --asdeps {' '.join(as_deps)}")
+        return success
+    
+    def build(self, targets: List[str]) -> bool:
+        resolved = self.resolve(targets)
+        if resolved is None:
+            # no dependency information: build the targets one by one and
+            # let makepkg pull repo dependencies itself
+            nodes = {name: {"names": {name}, "deps": set()} for name in targets}
+            layers = [[name] for name in targets]
+            repo_deps = set()
+            sync_deps = True
+        else:
+            nodes, repo_deps, missing = resolved
+            if missing:
+                print(f"{Colors.RED}Not found in the AUR: {', '.join(missing)}{Colors.END}")
+                return False
+            layers = self.layers(nodes)
+            sync_deps = False
+            if layers is None:
+                print(f"{Colors.RED}Dependency cycle between AUR packages, cannot build.{Colors.END}")
+                return False
+        
+        if repo_deps:
+            # one transaction up front so parallel makepkg runs never race for the pacman lock
+            print(f"{Colors.BLUE}📦 Installing {len(repo_deps)} repository build dependencies...{Colors.END}")
+            success, _ = self.helper.run_command(
+                f"sudo pacman -S --needed --asdeps --noconfirm {' '.join(sorted(repo_deps))}",
+                capture_output=False
+            )
+            if not success:
+                print(f"{Colors.RED}Failed to install build dependencies.{Colors.END}")
+                return False
+        
+        with tempfile.TemporaryDirectory() as build_dir:
+            for number, layer in enumerate(layers, 1):
+                print(f"{Colors.CYAN}Build wave {number}/{len(layers)}: {', '.join(layer)}{Colors.END}")
+                artifacts = {}
+                failed = []
+                with ThreadPoolExecutor(max_workers=min(self.max_jobs, len(layer))) as executor:
+                    futures = {executor.submit(self.build_node, base, build_dir, sync_deps): base for base in layer}
+                    for future in as_completed(futures):
+                        base = futures[future]
+                        success, artifacts[base] = future.result()
+                        mark = f"{Colors.GREEN}✓" if success else f"{Colors.RED}✗"
+                        took = "cached" if base in self.cached else f"{self.timings[base]:.1f}s"
+                        print(f"  {mark} {base}{Colors.END} ({took})")
+                        if not success:
+                            failed.append(base)
+                
+                if failed:
+                    print(f"{Colors.RED}Failed to build: {', '.join(sorted(failed))}{Colors.END}")
+                    return False
+                
+                if not self.install_layer(nodes, layer, artifacts, targets):
+                    print(f"{Colors.RED}Failed to install build wave {number}.{Colors.END}")
+                    return False
+        
+        self.report()
+        return True
+    
+    def report(self):
+        if not self.timings:
+            return
+        print(f"\n{Colors.CYAN}{'Package':<30} {'Build time'}{Colors.END}")
+        for base, seconds in sorted(self.timings.items(), key=lambda item: -item[1]):
+            print(f"{base:<30} {seconds:.1f}s")
+
+
+class BackupStore:
+    """content-addressed package state snapshots stored as compressed deltas"""
+    
+    def __init__(self, backup_dir: str = None, keep_count: int = 50, keep_days: int = 30):
+        self.backup_dir = backup_dir or os.path.expanduser("~/.cache/aur-helper/backups")
+        self.objects_dir = os.path.join(self.backup_dir, "objects")
+        self.index_file = os.path.join(self.backup_dir, "index.json")
+        self.keep_count = keep_count
+        self.keep_days = keep_days
+    
+    @staticmethod
+    def digest(packages: List[str]) -> str:
+        return hashlib.sha256("\n".join(packages).encode()).hexdigest()
+    
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, f"{digest}.json.gz")
+    
+    def head_path(self, digest: str) -> str:
+        """uncompressed copy of the newest snapshot, so restoring it needs no replay"""
+        return os.path.join(self.objects_dir, f"{digest}.txt")
+    
+    def _write(self, path: str, data: bytes):
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, path)
+    
+    def _write_object(self, digest: str, obj: dict):
+        self._write(self._object_path(digest), gzip.compress(json.dumps(obj).encode()))
+    
+    def _read_object(self, digest: str) -> dict:
+        with gzip.open(self._object_path(digest), 'rt') as f:
+            return json.load(f)
+    
+    def list(self) -> List[dict]:
+        """snapshots, oldest first"""
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f).get("snapshots", [])
+        except Exception:
+            return []
+    
+    def _save_index(self, snapshots: List[dict]):
+        self._write(self.index_file, json.dumps({"snapshots": snapshots}).encode())
+    
+    def save(self, packages: Set[str]) -> str:
+        """record a snapshot and return its digest, the stable way to refer to it"""
+        os.makedirs(self.objects_dir, exist_ok=True)
+        state = sorted(packages)
+        digest = self.digest(state)
+        snapshots = self.list()
+        head = snapshots[-1]["digest"] if snapshots else None
+        
+        if digest == head and os.path.exists(self.head_path(digest)):
+            return digest
+        
+        if not os.path.exists(self._object_path(digest)):
+            parent_state = self.restore(head) if head else None
+            if parent_state is None:
+                self._write_object(digest, {"packages": state})
+            else:
+                parent_set = set(parent_state)
+                self._write_object(digest, {
+                    "parent": head,
+                    "added": [pkg for pkg in state if pkg not in parent_set],
+                    "removed": sorted(parent_set.difference(packages))
+                })
+        
+        self._write(self.head_path(digest), "\n".join(state).encode())
+        if head and head != digest:
+            try:
+                os.remove(self.head_path(head))
+            except OSError:
+                pass
+        
+        snapshots.append({"digest": digest, "parent": head, "timestamp": time.time()})
+        self._save_index(snapshots)
+        self.prune()
+        return digest
+    
+    def resolve(self, ref: str) -> Optional[str]:
+        """full digest for a digest or unambiguous digest prefix of a kept snapshot"""
+        matches = {snap["digest"] for snap in self.list() if snap["digest"].startswith(ref)}
+        return matches.pop() if ref and len(matches) == 1 else None
+    
+    def restore(self, digest: str = None) -> Optional[List[str]]:
+        """package list of a snapshot (the newest by default)"""
+        if digest is None:
+            snapshots = self.list()
+            if not snapshots:
+                return None
+            digest = snapshots[-1]["digest"]
+        
+        try:
+            with open(self.head_path(digest), 'r') as f:
+                return f.read().split("\n")
+        except OSError:
+            pass
+        
+        # walk back to the nearest full snapshot, then replay the deltas forward
+        chain = []
+        try:
+            obj = self._read_object(digest)
+            while "packages" not in obj:
+                chain.append(obj)
+                obj = self._read_object(obj["parent"])
+        except Exception:
+            return None
+        
+        state = set(obj["packages"])
+        for delta in reversed(chain):
+            state.difference_update(delta["removed"])
+            state.update(delta["added"])
+        return sorted(state)
+    
+    def prune(self):
+        """apply the count/age retention policy and drop unreachable objects"""
+        snapshots = self.list()
+        keep = snapshots
+        if self.keep_count > 0:
+            keep = keep[-self.keep_count:]
+        if self.keep_days > 0:
+            cutoff = time.time() - self.keep_days * 86400
+            keep = [snap for snap in keep[:-1] if snap["timestamp"] >= cutoff] + keep[-1:]
+        if len(keep) == len(snapshots):
+            return
+        
+        # snapshots whose delta chain runs through a dropped object become full copies
+        kept = {snap["digest"] for snap in keep}
+        for digest in list(dict.fromkeys(snap["digest"] for snap in keep)):
+            try:
+                obj = self._read_object(digest)
+            except Exception:
+                continue
+            parent = obj.get("parent")
+            if parent and parent not in kept:
+                state = self.restore(digest)
+                if state is not None:
+                    self._write_object(digest, {"packages": state})
+        
+        self._save_index(keep)
+        for snap in snapshots:
+            if snap["digest"] not in kept:
+                for path in (self._object_path(snap["digest"]), self.head_path(snap["digest"])):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+
+class AsyncQueryRunner:
+    """runs independent read-only queries concurrently on asyncio subprocesses"""
+    
+    def __init__(self, logger: Logger, max_concurrency: int = 8, timeout: int = 300):
+        self.logger = logger
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+    
+    # tools that only ever read, and the pacman-style frontends whose operation decides
+    READ_ONLY_TOOLS = ("expac", "pacman-conf", "vercmp")
+    FRONTENDS = ("pacman", "yay", "paru")
+    OPERATIONS = {
+        "database": "D", "files": "F", "query": "Q", "remove": "R", "sync": "S", "deptest": "T",
+        "upgrade": "U", "version": "V", "help": "h", "getpkgbuild": "G", "show": "P", "yay": "Y"
+    }
+    SYNC_QUERIES = ("s", "i", "l", "p", "g")
+    SYNC_QUERIES_LONG = ("search", "info", "list", "print", "groups")
+    
+    @staticmethod
+    def is_read_only(cmd: str) -> bool:
+        """refuse anything that could take the pacman lock or change the system
+        
+        Only known query tools pass, and of pacman and the AUR helpers only
+        -Q, -T, -V, -P, -F without a refresh and -S with -s/-i/-l/-p/-g.
+        """
+        args = shlex.split(cmd)
+        if not args:
+            return False
+        program = os.path.basename(args[0])
+        
+        short, long = set(), set()
+        for arg in args[1:]:
+            if arg == "--":
+                break
+            if arg.startswith("--"):
+                long.add(arg[2:].split("=", 1)[0])
+            elif arg.startswith("-"):
+                short.update(arg[1:])
+        
+        if program in AsyncQueryRunner.READ_ONLY_TOOLS:
+            return True
+        if program == "pacman-key":
+            return (bool(short or long) and short <= set("lfevhV")
+                    and long <= {"list-keys", "list-sigs", "finger", "export", "verify", "help", "version"})
+        if program not in AsyncQueryRunner.FRONTENDS:
+            return False
+        
+        operations = {flag for flag in short if flag in AsyncQueryRunner.OPERATIONS.values()}
+        operations.update(AsyncQueryRunner.OPERATIONS[option] for option in long if option in AsyncQueryRunner.OPERATIONS)
+        # no operation at all is a full upgrade for yay and paru
+        if len(operations) != 1:
+            return False
+        operation = operations.pop()
+        if operation in ("Q", "T", "V", "P", "h"):
+            return True
+        if operation not in ("S", "F"):
+            return False
+        if short & set("yucw") or long & {"refresh", "sysupgrade", "clean", "downloadonly"}:
+            return False
+        return operation == "F" or bool(
+            short & set(AsyncQueryRunner.SYNC_QUERIES) or long & set(AsyncQueryRunner.SYNC_QUERIES_LONG)
+        )
+    
+    async def _run_one(self, semaphore: asyncio.Semaphore, cmd: str) -> Dict[str, object]:
+        async with semaphore:
+            start = time.time()
+            result = {"command": cmd, "success": False, "returncode": None, "output": ""}
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *shlex.split(cmd),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT
+                )
+                try:
+                    stdout, _ = await asyncio.wait_for(process.communicate(), self.timeout)
+                except asyncio.TimeoutError:
+                    process.kill()
+                    await process.wait()
+                    self.logger.error(f"Command timed out: {cmd}", command=cmd)
+                    result["output"] = "Command timed out"
+                else:
+                    result["returncode"] = process.returncode
+                    result["success"] = process.returncode == 0
+                    result["output"] = stdout.decode(errors='replace').strip()
+            except Exception as e:
+                self.logger.error(f"Command execution failed: {cmd} - {str(e)}", command=cmd)
+                result["output"] = str(e)
+            result["duration"] = time.time() - start
+            if result["returncode"] is not None:
+                self.logger.info(
+                    f"Executed query: {cmd} (exit code: {result['returncode']}, {result['duration']:.2f}s)",
+                    command=cmd, exit_code=result["returncode"], duration=round(result["duration"], 3)
+                )
+            return result
+    
+    async def _run_all(self, cmds: List[str]) -> List[Dict[str, object]]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.gather(*(self._run_one(semaphore, cmd) for cmd in cmds))
+    
+    def run(self, cmds: List[str]) -> List[Dict[str, object]]:
+        """results in the same order as `cmds`"""
+        mutating = [cmd for cmd in cmds if not self.is_read_only(cmd)]
+        if mutating:
+            raise ValueError(f"Not a read-only query: {mutating[0]}")
+        if not cmds:
+            return []
+        return asyncio.run(self._run_all(cmds))
+
+
+class OperationJournal:
+    """append-only operation journal with offset and per-package sidecar indexes"""
+    
+    OFFSET = struct.Struct("<Q")
+    
+    def __init__(self, journal_file: str = None):
+        self.journal_file = journal_file or os.path.expanduser("~/.cache/aur-helper/journal.jsonl")
+        self.offset_file = f"{self.journal_file}.idx"
+        self.package_index = f"{self.journal_file}.pkg"
+        self._lock = threading.Lock()
+    
+    def record(self, operation: str, packages: List[str], manager: str, mode: str = None,
+               duration: float = 0.0, success: bool = True, backup: str = None) -> int:
+        """append one operation and return its record number"""
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "operation": operation,
+            "packages": packages,
+            "manager": manager,
+            "mode": mode,
+            "duration": round(duration, 3),
+            "success": success,
+            # digest of the BackupStore snapshot taken before the operation
+            "backup": backup
+        }
+        line = (json.dumps(entry) + "\n").encode()
+        
+        with self._lock:
+            os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+            self._ensure_offsets()
+            with open(self.journal_file, 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(line)
+            with open(self.offset_file, 'ab') as f:
+                record_no = f.seek(0, os.SEEK_END) // self.OFFSET.size
+                f.write(self.OFFSET.pack(offset))
+            if packages:
+                with dbm.open(self.package_index, 'c') as db:
+                    for package in set(packages):
+                        db[package] = db.get(package, b"") + f"{record_no} ".encode()
+        return record_no
+    
+    def _ensure_offsets(self):
+        """rebuild the sidecar indexes with one scan if they are missing"""
+        if os.path.exists(self.offset_file) or not os.path.exists(self.journal_file):
+            return
+        offsets = []
+        packages = {}
+        with open(self.journal_file, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                for package in set(entry.get("packages") or []):
+                    packages.setdefault(package, []).append(len(offsets))
+                offsets.append(offset)
+                offset += len(line)
+        with open(self.offset_file, 'wb') as f:
+            f.write(b"".join(self.OFFSET.pack(offset) for offset in offsets))
+        with dbm.open(self.package_index, 'n') as db:
+            for package, records in packages.items():
+                db[package] = "".join(f"{record_no} " for record_no in records).encode()
+    
+    def _read(self, record_numbers: List[int]) -> List[dict]:
+        entries = []
+        with open(self.offset_file, 'rb') as offsets, open(self.journal_file, 'rb') as journal:
+            for record_no in record_numbers:
+                offsets.seek(record_no * self.OFFSET.size)
+                raw = offsets.read(self.OFFSET.size)
+                if len(raw) < self.OFFSET.size:
+                    continue
+                journal.seek(self.OFFSET.unpack(raw)[0])
+                try:
+                    entries.append(json.loads(journal.readline()))
+                except ValueError:
+                    continue
+        return entries
+    
+    def count(self) -> int:
+        try:
+            return os.path.getsize(self.offset_file) // self.OFFSET.size
+        except OSError:
+            return 0
+    
+    def tail(self, n: int = 5) -> List[dict]:
+        """last `n` operations, oldest first, read backwards from the end"""
+        try:
+            with self._lock:
+                self._ensure_offsets()
+            total = self.count()
+            return self._read(list(range(max(0, total - n), total)))
+        except Exception:
+            return []
+    
+    def for_package(self, package: str) -> List[dict]:
+        """every operation that touched `package`"""
+        try:
+            with self._lock:
+                self._ensure_offsets()
+            with dbm.open(self.package_index, 'r') as db:
+                records = db.get(package, b"").split()
+            return self._read([int(record_no) for record_no in records])
+        except Exception:
+            return []
+
+
+class SyncRefresher:
+    """refreshes the repo sync databases in parallel with conditional requests and ranked mirrors"""
+    
+    def __init__(self, pacman_conf: PacmanConf, sync_dir: str, mirrors: List[str] = None, jobs: int = 4,
+                 state_file: str = None, timeout: int = 30, logger: Optional[Logger] = None, lock_file: str = None):
+        self.pacman_conf = pacman_conf
+        self.sync_dir = sync_dir
+        # pacman's lock lives in DBPath, next to sync/
+        self.lock_file = lock_file or os.path.join(os.path.dirname(os.path.normpath(sync_dir)), "db.lck")
+        self.mirrors = mirrors or []
+        self.jobs = jobs
+        self.state_file = state_file or os.path.expanduser("~/.cache/aur-helper/mirrors.json")
+        self.timeout = timeout
+        self.logger = logger
+        self.state = self._load_state()
+        self._lock = threading.Lock()
+    
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            return {"etags": state.get("etags", {}), "mirrors": state.get("mirrors", {})}
+        except Exception:
+            return {"etags": {}, "mirrors": {}}
+    
+    def _save_state(self):
+        try:
+            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+            tmp_file = f"{self.state_file}.tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp_file, self.state_file)
+        except Exception:
+            pass
+    
+    def servers(self, repo: str) -> List[str]:
+        if self.mirrors:
+            return [
+                mirror.replace("$repo", repo).replace("$arch", self.pacman_conf.architecture)
+                for mirror in self.mirrors
+            ]
+        return self.pacman_conf.server_urls(repo)
+    
+    @staticmethod
+    def _mirror_key(url: str) -> str:
+        return urllib.parse.urlsplit(url).netloc
+    
+    def _score(self, url: str) -> float:
+        """expected seconds to fetch a 1 MiB database; unmeasured mirrors sit in the middle"""
+        stats = self.state["mirrors"].get(self._mirror_key(url))
+        if not stats:
+            return 1.0
+        return stats["latency"] + (1024 * 1024) / max(stats["throughput"], 1.0) + stats.get("failures", 0) * 5.0
+    
+    def rank(self, urls: List[str]) -> List[str]:
+        return sorted(urls, key=self._score)
+    
+    def _record(self, url: str, latency: float, size: int = 0, seconds: float = 0.0, failed: bool = False):
+        with self._lock:
+            stats = self.state["mirrors"].setdefault(self._mirror_key(url), {"latency": latency, "throughput": 1024 * 1024})
+            # exponentially weighted, so one slow response doesn't banish a mirror
+            stats["latency"] = 0.7 * stats["latency"] + 0.3 * latency
+            if size and seconds > 0:
+                stats["throughput"] = 0.7 * stats["throughput"] + 0.3 * (size / seconds)
+            stats["failures"] = stats.get("failures", 0) + 1 if failed else 0
+    
+    def _fetch_signature(self, url: str) -> Optional[bytes]:
+        """detached database signature, None when the mirror has none"""
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+    
+    def _write_signature(self, path: str, data: bytes):
+        tmp_file = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.part")
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, path)
+    
+    def fetch(self, repo: str, servers: List[str]) -> Dict[str, object]:
+        target = os.path.join(self.sync_dir, f"{repo}.db")
+        result = {"repo": repo, "status": "failed", "mirror": None, "bytes": 0, "seconds": 0.0}
+        
+        for server in servers[:3]:
+            url = f"{server.rstrip('/')}/{repo}.db"
+            headers = {}
+            if os.path.exists(target):
+                headers["If-Modified-Since"] = formatdate(os.stat(target).st_mtime, usegmt=True)
+                etag = self.state["etags"].get(url)
+                if etag:
+                    headers["If-None-Match"] = etag
+            
+            start = time.time()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=self.timeout) as response:
+                    latency = time.time() - start
+                    tmp_file = os.path.join(self.sync_dir, f".{repo}.db.part")
+                    size = 0
+                    with open(tmp_file, 'wb') as f:
+                        while True:
+                            chunk = response.read(64 * 1024)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                            size += len(chunk)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    
+                    last_modified = response.headers.get("Last-Modified")
+                    if last_modified:
+                        stamp = parsedate_to_datetime(last_modified).timestamp()
+                        os.utime(tmp_file, (stamp, stamp))
+                    
+                    # the signature has to match the new database, or pacman rejects it
+                    try:
+                        signature = self._fetch_signature(f"{url}.sig")
+                    except (OSError, ValueError):
+                        os.remove(tmp_file)
+                        raise
+                    os.replace(tmp_file, target)
+                    if signature is not None:
+                        self._write_signature(f"{target}.sig", signature)
+                    elif os.path.exists(f"{target}.sig"):
+                        os.remove(f"{target}.sig")
+                    
+                    with self._lock:
+                        if response.headers.get("ETag"):
+                            self.state["etags"][url] = response.headers["ETag"]
+                    self._record(url, latency, size, time.time() - start)
+                    result.update(status="updated", mirror=server, bytes=size)
+                    break
+            except urllib.error.HTTPError as e:
+                if e.code == 304:
+                    self._record(url, time.time() - start)
+                    # touch the database so its age reflects this successful check
+                    os.utime(target, (time.time(), os.stat(target).st_mtime))
+                    result.update(status="unchanged", mirror=server)
+                    break
+                self._record(url, time.time() - start, failed=True)
+            except (OSError, ValueError) as e:
+                self._record(url, time.time() - start, failed=True)
+                if self.logger:
+                    self.logger.warning(f"Failed to fetch {url}: {e}")
+        
+        result["seconds"] = round(time.time() - start, 3) if servers else 0.0
+        return result
+    
+    def refresh(self, repos: List[str] = None) -> Optional[List[Dict[str, object]]]:
+        """per-repo results; None when another pacman holds the database lock"""
+        repos = repos or self.pacman_conf.repos
+        if not repos:
+            return []
+        
+        jobs = []
+        for i, repo in enumerate(repos):
+            servers = self.rank(self.servers(repo))
+            # spread repositories over the best few mirrors instead of queueing on one
+            spread = min(len(servers), self.jobs, 3)
+            if spread > 1:
+                offset = i % spread
+                servers = servers[offset:spread] + servers[:offset] + servers[spread:]
+            jobs.append((repo, servers))
+        
+        try:
+            # taken like pacman does, so no transaction or -Sy runs while databases are replaced
+            lock = os.open(self.lock_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o000)
+        except FileExistsError:
+            return None
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as executor:
+                results = list(executor.map(lambda job: self.fetch(*job), jobs))
+        finally:
+            os.close(lock)
+            os.remove(self.lock_file)
+        self._save_state()
+        return results
+
+
+class Prefetcher:
+    """downloads a transaction's package files into the pacman cache before it starts"""
+    
+    def __init__(self, helper: "AURHelper", cache_dir: str, jobs: int = 4, timeout: int = 60):
+        self.helper = helper
+        self.cache_dir = cache_dir
+        self.jobs = jobs
+        self.timeout = timeout
+    
+    def resolve(self, targets: Optional[List[str]]) -> List[dict]:
+        """package files pacman would download; `None` targets means a system upgrade"""
+        if targets is None:
+            cmd = "pacman -Sup --print-format '%l'"
+        else:
+            # pacman can only resolve repository packages, AUR targets are built later
+            targets = [target for target in targets if self.helper.sync_index.exists(target)]
+            if not targets:
+                return []
+            cmd = f"pacman -Sp --print-format '%l' {' '.join(targets)}"
+        
+        success, output = self.helper.run_command(cmd)
+        if not success:
+            return []
+        
+        files = []
+        for url in output.splitlines():
+            url = url.strip()
+            if "://" not in url or url.startswith("file://"):
+                continue
+            filename = urllib.parse.unquote(url.rsplit("/", 1)[-1])
+            parsed = parse_package_filename(filename)
+            entry = None
+            if parsed:
+                entry = next((e for e in self.helper.sync_index.find(parsed[0]) if e["filename"] == filename), None)
+            
+            mirrors = [url]
+            if entry:
+                mirrors += [
+                    f"{server.rstrip('/')}/{filename}"
+                    for server in self.helper.pacman_conf.server_urls(entry["repo"])
+                    if f"{server.rstrip('/')}/{filename}" != url
+                ]
+            files.append({
+                "filename": filename,
+                "urls": mirrors,
+                "size": entry["csize"] if entry else 0,
+                "sha256": entry["sha256"] if entry else ""
+            })
+        return files
+    
+    def _verify(self, path: str, item: dict) -> bool:
+        if item["sha256"]:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            return digest.hexdigest() == item["sha256"]
+        return not item["size"] or os.path.getsize(path) == item["size"]
+    
+    def download(self, item: dict) -> Dict[str, object]:
+        target = os.path.join(self.cache_dir, item["filename"])
+        # same name pacman uses for partial downloads, so either side can resume the other
+        partial = f"{target}.part"
+        result = {"filename": item["filename"], "status": "failed", "bytes": 0}
+        
+        if os.path.exists(target) and self._verify(target, item):
+            result["status"] = "cached"
+            return result
+        
+        for url in item["urls"][:3]:
+            offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=self.timeout) as response:
+                    resumed = offset and response.status == 206
+                    with open(partial, 'ab' if resumed else 'wb') as f:
+                        while True:
+                            chunk = response.read(256 * 1024)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                            result["bytes"] += len(chunk)
+            except urllib.error.HTTPError as e:
+                if e.code == 416 and offset:
+                    # the partial file is already complete (or bogus); verification decides
+                    pass
+                else:
+                    continue
+            except (OSError, ValueError):
+                continue
+            
+            if self._verify(partial, item):
+                os.replace(partial, target)
+                result["status"] = "downloaded"
+                return result
+            os.remove(partial)
+        
+        return result
+    
+    def run(self, targets: Optional[List[str]]) -> Dict[str, object]:
+        start = time.time()
+        files = self.resolve(targets)
+        results = []
+        if files:
+            with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as executor:
+                results = list(executor.map(self.download, files))
+        return {
+            "files": len(results),
+            "downloaded": sum(1 for r in results if r["status"] == "downloaded"),
+            "cached": sum(1 for r in results if r["status"] == "cached"),
+            "failed": sum(1 for r in results if r["status"] == "failed"),
+            "bytes": sum(r["bytes"] for r in results),
+            "seconds": time.time() - start
+        }
+    
+    def start(self, targets: Optional[List[str]]):
+        """run in the background; returns a future resolving to the summary"""
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self.run, targets)
+        executor.shutdown(wait=False)
+        return future
+
+
+class CacheManager:
+    """prunes the pacman package cache per package instead of all at once"""
+    
+    def __init__(self, cache_dirs: List[str], keep_versions: int = 3, keep_uninstalled: int = 0,
+                 max_size: int = 0, jobs: int = 8):
+        self.cache_dirs = cache_dirs
+        self.keep_versions = max(1, keep_versions)
+        self.keep_uninstalled = max(0, keep_uninstalled)
+        self.max_size = max_size
+        self.jobs = jobs
+    
+    @staticmethod
+    def _stat(entries: List[os.DirEntry]) -> List[Tuple[str, str, int, float]]:
+        files = []
+        for entry in entries:
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            files.append((entry.name, entry.path, stat.st_size, stat.st_mtime))
+        return files
+    
+    def scan(self) -> Dict[str, List[dict]]:
+        """package files grouped by name, newest version first"""
+        entries = []
+        for cache_dir in self.cache_dirs:
+            try:
+                with os.scandir(cache_dir) as it:
+                    entries.extend(it)
+            except OSError:
+                continue
+        
+        chunk = max(1, len(entries) // (self.jobs * 4) + 1)
+        with ThreadPoolExecutor(max_workers=max(1, self.jobs)) as executor:
+            batches = executor.map(self._stat, [entries[i:i + chunk] for i in range(0, len(entries), chunk)])
+            files = [item for batch in batches for item in batch]
+        
+        # detached signatures follow their package file
+        signatures = {path[:-4]: size for name, path, size, _ in files if name.endswith(".sig")}
+        groups = {}
+        for name, path, size, mtime in files:
+            parsed = parse_package_filename(name)
+            if not parsed:
+                continue
+            pkgname, version, arch = parsed
+            groups.setdefault(pkgname, []).append({
+                "path": path,
+                "version": version,
+                "arch": arch,
+                "size": size + signatures.get(path, 0),
+                "mtime": mtime,
+                "signature": path in signatures
+            })
+        
+        newest_first = functools.cmp_to_key(lambda a, b: vercmp(b["version"], a["version"]))
+        for versions in groups.values():
+            versions.sort(key=newest_first)
+        return groups
+    
+    def plan(self, installed: Dict[str, str]) -> Tuple[List[dict], List[dict]]:
+        """(remove, keep) for `installed` name -> version (empty version if unknown)"""
+        remove, keep = [], []
+        candidates = []
+        for pkgname, versions in self.scan().items():
+            current = installed.get(pkgname)
+            limit = self.keep_versions if current is not None else self.keep_uninstalled
+            for rank, item in enumerate(versions):
+                # the installed version stays regardless, it is what a rollback lands on
+                if current and item["version"] == current:
+                    keep.append(item)
+                elif rank < limit:
+                    keep.append(item)
+                    candidates.append((rank, item))
+                else:
+                    remove.append(item)
+        
+        if self.max_size:
+            # over budget: drop the oldest kept versions first, oldest files first within a rank
+            total = sum(item["size"] for item in keep)
+            candidates.sort(key=lambda entry: (-entry[0], entry[1]["mtime"]))
+            dropped = set()
+            for _, item in candidates:
+                if total <= self.max_size:
+                    break
+                dropped.add(item["path"])
+                remove.append(item)
+                total -= item["size"]
+            if dropped:
+                keep = [item for item in keep if item["path"] not in dropped]
+        
+        return remove, keep
+    
+    def remove(self, items: List[dict]) -> Tuple[int, List[str]]:
+        """delete files; returns (bytes freed, paths that need privileges)"""
+        freed = 0
+        denied = []
+        for item in items:
+            paths = [item["path"]] + ([item["path"] + ".sig"] if item["signature"] else [])
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except PermissionError:
+                    denied.append(path)
+                    continue
+            if item["path"] not in denied:
+                freed += item["size"]
+        return freed, denied
+
+
+class UpgradePlanner:
+    """offline upgrade plan: local versions against sync (and cached AUR) versions"""
+    
+    def __init__(self, local_db: LocalDatabase, sync_index: SyncIndex, pacman_conf: PacmanConf,
+                 aur: Optional[AURClient] = None):
+        self.local_db = local_db
+        self.sync_index = sync_index
+        self.pacman_conf = pacman_conf
+        self.aur = aur
+    
+    def _repo_order(self) -> Dict[str, int]:
+        order = {repo: i for i, repo in enumerate(self.pacman_conf.repos)}
+        for repo in sorted(self.sync_index.repos):
+            order.setdefault(repo, len(order))
+        return order
+    
+    def plan(self, include_aur: bool = False) -> Dict[str, object]:
+        """pending upgrades; aur_complete is False when AUR versions were not all known"""
+        self.sync_index.refresh()
+        local = self.local_db.packages()
+        order = self._repo_order()
+        # like pacman, IgnoreGroup goes by the groups of the new (sync) packages
+        ignored = set(self.pacman_conf.ignore_packages)
+        for group in self.pacman_conf.ignore_groups:
+            ignored.update(entry["name"] for entry in self.sync_index.group(group))
+        
+        candidates = []
+        foreign = []
+        for name, pkg in local.items():
+            if name in ignored:
+                continue
+            entries = self.sync_index.by_name.get(name)
+            if not entries:
+                foreign.append(name)
+                continue
+            # pacman takes a package from the first repository that carries it
+            entry = min(entries, key=lambda e: order.get(e["repo"], len(order)))
+            candidates.append((pkg, entry))
+        
+        upgrades = []
+        results = vercmp_batch([(entry["version"], pkg["version"]) for pkg, entry in candidates])
+        for (pkg, entry), result in zip(candidates, results):
+            if result > 0:
+                upgrades.append({
+                    "name": pkg["name"],
+                    "old": pkg["version"],
+                    "new": entry["version"],
+                    "repo": entry["repo"],
+                    "download_size": entry["csize"],
+                    "installed_size": entry["isize"],
+                    "size_change": entry["isize"] - pkg["size"]
+                })
+        
+        aur_complete = True
+        if include_aur and foreign:
+            aur_info = self.aur.info(foreign, offline=True) if self.aur else None
+            if aur_info is None or len(aur_info) < len(foreign):
+                aur_complete = False
+            for name, info in (aur_info or {}).items():
+                if vercmp(info.get("Version", "0"), local[name]["version"]) > 0:
+                    upgrades.append({
+                        "name": name,
+                        "old": local[name]["version"],
+                        "new": info["Version"],
+                        "repo": "aur",
+                        "download_size": 0,
+                        "installed_size": 0,
+                        "size_change": 0
+                    })
+        
+        upgrades.sort(key=lambda upgrade: (upgrade["repo"] == "aur", upgrade["name"]))
+        return {
+            "upgrades": upgrades,
+            "download_size": sum(upgrade["download_size"] for upgrade in upgrades),
+            "size_change": sum(upgrade["size_change"] for upgrade in upgrades),
+            "aur_complete": aur_complete
+        }
+    
+    def databases_age(self) -> Optional[float]:
+        """seconds since the sync databases were last written, None without any"""
+        newest = None
+        for path in self.sync_index._db_files().values():
+            try:
+                # ctime moves when pacman rewrites the file, mtime is the mirror's timestamp
+                changed = os.stat(path).st_ctime
+            except OSError:
+                continue
+            newest = changed if newest is None else max(newest, changed)
+        return None if newest is None else time.time() - newest
+
+
+class InstallPlanner:
+    """offline install plan: dependency closure over the local, sync and cached AUR metadata"""
+    
+    def __init__(self, local_db: LocalDatabase, sync_index: SyncIndex, pacman_conf: PacmanConf,
+                 aur: Optional[AURClient] = None):
+        self.local_db = local_db
+        self.sync_index = sync_index
+        self.pacman_conf = pacman_conf
+        self.aur = aur
+        self.local = local_db.packages()
+        self._order = {repo: i for i, repo in enumerate(pacman_conf.repos)}
+        for repo in sorted(sync_index.repos):
+            self._order.setdefault(repo, len(self._order))
+        self._installed_provides = {}
+        for pkg in self.local.values():
+            for provided in pkg["provides"]:
+                name, _, version = parse_dep(provided)
+                self._installed_provides.setdefault(name, []).append(version)
+        # dependency string -> resolution, shared by every plan made with this planner
+        self._resolved = {}
+    
+    @staticmethod
+    def _provide_satisfies(provided: Optional[str], op: Optional[str], version: Optional[str]) -> bool:
+        """like pacman, an unversioned provide only satisfies unversioned dependencies"""
+        if not op:
+            return True
+        return provided is not None and version_satisfies(provided, op, version)
+    
+    def _installed(self, name: str, op: Optional[str], version: Optional[str]) -> bool:
+        pkg = self.local.get(name)
+        if pkg and version_satisfies(pkg["version"], op, version):
+            return True
+        return any(self._provide_satisfies(provided, op, version) for provided in self._installed_provides.get(name, ()))
+    
+    def _from_repos(self, name: str, op: Optional[str], version: Optional[str]) -> Optional[dict]:
+        rank = lambda entry: self._order.get(entry["repo"], len(self._order))
+        for entry in sorted(self.sync_index.find(name), key=rank):
+            if version_satisfies(entry["version"], op, version):
+                return entry
+        # virtual packages: like pacman without a prompt, the first repository's provider wins
+        for entry in sorted(self.sync_index.providers(name), key=lambda e: (rank(e), e["name"])):
+            for provided in entry["provides"]:
+                provided_name, _, provided_version = parse_dep(provided)
+                if provided_name == name and self._provide_satisfies(provided_version, op, version):
+                    return entry
+        return None
+    
+    def resolve(self, dep: str, target: bool = False) -> Tuple[str, object]:
+        """("installed", name), ("repo", entry) or ("aur", name) for AUR candidates"""
+        key = (dep, target)
+        if key not in self._resolved:
+            name, op, version = parse_dep(dep)
+            # a target is (re)installed even when something already satisfies it
+            if not target and self._installed(name, op, version):
+                self._resolved[key] = ("installed", name)
+            else:
+                entry = self._from_repos(name, op, version)
+                self._resolved[key] = ("repo", entry) if entry else ("aur", name)
+        return self._resolved[key]
+    
+    def _cached(self, filename: str) -> bool:
+        return any(os.path.exists(os.path.join(cache_dir, filename)) for cache_dir in self.pacman_conf.cache_dirs)
+    
+    def plan(self, targets: List[str], offline: bool = False, include_aur: bool = True) -> Dict[str, object]:
+        """closure of `targets`; without include_aur, names outside the repositories are missing"""
+        self.sync_index.refresh()
+        repo = {}
+        aur = {}
+        missing = []
+        aur_complete = True
+        seen = set()
+        level = [(target, True) for target in dict.fromkeys(targets)]
+        
+        while level:
+            next_level = []
+            aur_wanted = []
+            for dep, target in level:
+                if (dep, target) in seen:
+                    continue
+                seen.add((dep, target))
+                kind, value = self.resolve(dep, target)
+                if kind == "repo":
+                    if value["name"] not in repo:
+                        repo[value["name"]] = (value, target)
+                        next_level.extend((d, False) for d in value["depends"])
+                elif kind == "aur" and value not in aur:
+                    aur_wanted.append(value)
+            
+            if aur_wanted and not include_aur:
+                missing.extend(aur_wanted)
+            elif aur_wanted:
+                found = self.aur.info(aur_wanted, offline=offline) if self.aur else None
+                if found is None:
+                    # unknown rather than missing: the AUR could not be asked
+                    aur_complete = False
+                    found = {}
+                for name in aur_wanted:
+                    if name not in found:
+                        if aur_complete:
+                            missing.append(name)
+                        continue
+                    info = found[name]
+                    aur[name] = (info, name in targets)
+                    next_level.extend(
+                        (d, False)
+                        for d in info.get("Depends", []) + info.get("MakeDepends", []) + info.get("CheckDepends", [])
+                    )
+            level = next_level
+        
+        packages = []
+        sources = {}
+        for name, (entry, target) in sorted(repo.items()):
+            download = 0 if self._cached(entry["filename"]) else entry["csize"]
+            packages.append({
+                "name": name,
+                "version": entry["version"],
+                "repo": entry["repo"],
+                "download_size": download,
+                "installed_size": entry["isize"],
+                "dependency": not target
+            })
+            source = sources.setdefault(entry["repo"], {"packages": 0, "download_size": 0, "installed_size": 0})
+            source["packages"] += 1
+            source["download_size"] += download
+            source["installed_size"] += entry["isize"]
+        
+        nodes = {}
+        for name, (info, target) in aur.items():
+            base = info.get("PackageBase", name)
+            nodes.setdefault(base, {"names": set(), "deps": set()})["names"].add(name)
+        for name, (info, _) in aur.items():
+            base = info.get("PackageBase", name)
+            for dep in info.get("Depends", []) + info.get("MakeDepends", []) + info.get("CheckDepends", []):
+                dep = dep_name(dep)
+                if dep in aur and aur[dep][0].get("PackageBase", dep) != base:
+                    nodes[base]["deps"].add(aur[dep][0].get("PackageBase", dep))
+        if aur:
+            sources["aur"] = {"packages": len(aur), "download_size": 0, "installed_size": 0}
+        
+        return {
+            "targets": targets,
+            "packages": packages + [
+                {"name": name, "version": info.get("Version", "unknown"), "repo": "aur",
+                 "download_size": 0, "installed_size": 0, "dependency": not target}
+                for name, (info, target) in sorted(aur.items())
+            ],
+            "build_order": BuildScheduler.layers(nodes),
+            "missing": sorted(set(missing)),
+            "sources": sources,
+            "download_size": sum(pkg["download_size"] for pkg in packages),
+            "installed_size": sum(pkg["installed_size"] for pkg in packages),
+            "aur_complete": aur_complete
+        }
+
+
+def format_size(size: int) -> str:
+    value = float(size)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(value) < 1024 or unit == "GiB":
+            return f"{value:.1f} {unit}" if unit != "B" else f"{int(value)} B"
+        value /= 1024
+    return f"{value:.1f} GiB"
+
+
 class AURHelper:
     """main helper class"""
     
     def __init__(self):
-        self.logger = Logger()
+        self.profiler = Profiler()
         self.config = Config()
+        self.logger = Logger(
+            log_format=self.config.get("log_format", "text"),
+            max_bytes=self.config.get("log_max_bytes", 5 * 1024 * 1024),
+            backup_count=self.config.get("log_backup_count", 3)
+        )
         self.supported_managers = {
             "pacman": {"name": "Pacman", "needs_sudo": True, "aur_support": False},
             "yay": {"name": "Yay", "needs_sudo": False, "aur_support": True},
             "paru": {"name": "Paru", "needs_sudo": False, "aur_support": True}
         }
         self.current_manager = None
+        self.pacman_conf = PacmanConf(self.config.get("pacman_conf", "/etc/pacman.conf"))
+        self.local_db = LocalDatabase(self.config.get("pacman_db_path", "/var/lib/pacman"))
+        self.sync_index = SyncIndex(self.config.get("pacman_db_path", "/var/lib/pacman"))
+        self.aur = AURClient(
+            self.config.get("aur_rpc_url", "https://aur.archlinux.org/rpc/v5"),
+            ttl=self.config.get("aur_cache_ttl", 3600)
+        )
+        self.journal = OperationJournal()
+        self.queries = AsyncQueryRunner(self.logger, self.config.get("max_concurrent_queries", 8))
+        self.backups = BackupStore(
+            keep_count=self.config.get("backup_keep_count", 50),
+            keep_days=self.config.get("backup_keep_days", 30)
+        )
+        self._repo_matcher = None
+        self._repo_matcher_signature = None
+        self._install_planner = None
+        self._install_planner_signature = None
     
     def run_command(self, cmd: str, capture_output: bool = True, shell: bool = True) -> Tuple[bool, str]:
         """execute command with improved error handling"""
-        self.logger.info(f"Executing command: {cmd}")
+        with self.profiler.span("run_command", command=cmd):
+            return self._run_command(cmd, capture_output, shell)
+    
+    def _run_command(self, cmd: str, capture_output: bool, shell: bool) -> Tuple[bool, str]:
+        start = time.time()
         
         try:
             if capture_output:
@@ -157,19 +2554,56 @@ class AURHelper:
                 success = result.returncode == 0
                 output = ""
             
+            duration = time.time() - start
+            self.logger.info(
+                f"Executed command: {cmd} (exit code: {result.returncode}, {duration:.2f}s)",
+                command=cmd, exit_code=result.returncode, duration=round(duration, 3)
+            )
+            
             if not success:
-                self.logger.error(f"Command failed: {cmd} (exit code: {result.returncode})")
+                self.logger.error(f"Command failed: {cmd} (exit code: {result.returncode})",
+                                  command=cmd, exit_code=result.returncode)
                 if capture_output:
-                    self.logger.error(f"Output: {output}")
+                    self.logger.error(f"Output: {output}", command=cmd)
             
             return success, output
         
-        except subprocess.TimeoutExpired:
-            self.logger.error(f"Command timed out: {cmd}")
-            return False, "Command timed out"
+        except subprocess.TimeoutExpired:
+            self.logger.error(f"Command timed out: {cmd}", command=cmd, duration=round(time.time() - start, 3))
+            return False, "Command timed out"
+        except Exception as e:
+            self.logger.error(f"Command execution failed: {cmd} - {str(e)}", command=cmd)
+            return False, str(e)
+    
+    def stream_command(self, cmd: str, shell: bool = True) -> Iterator[str]:
+        """execute command and yield its output line by line as it arrives"""
+        self.logger.info(f"Streaming command: {cmd}")
+        
+        try:
+            process = subprocess.Popen(
+                cmd,
+                shell=shell,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True
+            )
         except Exception as e:
             self.logger.error(f"Command execution failed: {cmd} - {str(e)}")
-            return False, str(e)
+            return
+        
+        finished = False
+        try:
+            for line in process.stdout:
+                yield line.rstrip("\n")
+            finished = True
+        finally:
+            # the consumer may stop early; don't leave the child running
+            if process.poll() is None:
+                process.terminate()
+            process.stdout.close()
+            returncode = process.wait()
+            if finished and returncode != 0:
+                self.logger.error(f"Command failed: {cmd} (exit code: {returncode})")
     
     def is_installed(self, tool: str) -> bool:
         """is installed"""
@@ -181,36 +2615,45 @@ class AURHelper:
         pattern = r'^[a-zA-Z0-9][a-zA-Z0-9@._+-]*$'
         return bool(re.match(pattern, package)) and len(package) <= 255
     
-    def get_installed_packages(self) -> List[str]:
-        """list of installed packages"""
+    @profiled("get_installed_packages")
+    def get_installed_packages(self) -> Set[str]:
+        """set of installed packages"""
+        if self.local_db.available():
+            return self.local_db.names()
+        
         success, output = self.run_command("pacman -Qq")
         if success:
-            return output.split('\n') if output else []
-        return []
+            return set(output.split('\n')) if output else set()
+        return set()
     
+    @profiled("backup_system_state")
     def backup_system_state(self) -> Optional[str]:
-        """backup of current package state"""
+        """backup of current package state, returns the snapshot digest"""
         if not self.config.get("backup_before_operations"):
             return None
         
         try:
-            backup_dir = os.path.expanduser("~/.cache/aur-helper/backups")
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = os.path.join(backup_dir, f"packages_{timestamp}.txt")
-            
-            success, output = self.run_command("pacman -Qq")
-            if success:
-                with open(backup_file, 'w') as f:
-                    f.write(output)
-                self.logger.info(f"System state backed up to: {backup_file}")
-                return backup_file
+            installed_packages = self.get_installed_packages()
+            if installed_packages:
+                backup = self.backups.save(installed_packages)
+                self.logger.info(f"System state backed up as snapshot {backup}")
+                return backup
         except Exception as e:
             self.logger.error(f"Failed to backup system state: {e}")
         
         return None
     
+    def show_backup_hint(self, backup: str):
+        print(f"{Colors.YELLOW}System backup: snapshot {backup[:12]} "
+              f"(package list: aur-helper backup show {backup[:12]}){Colors.END}")
+    
+    def record_operation(self, operation: str, packages: List[str], manager: str, mode: Optional[str],
+                         start: float, success: bool, backup: Optional[str]):
+        try:
+            self.journal.record(operation, packages, manager, mode, time.time() - start, success, backup)
+        except Exception as e:
+            self.logger.error(f"Failed to record operation in journal: {e}")
+    
     def install_helper(self, helper: str) -> bool:
         print(f"{Colors.YELLOW}{helper} not found.{Colors.END}")
         
@@ -231,119 +2674,155 @@ class AURHelper:
                 print(f"{Colors.RED}Failed to install git. Cannot proceed.{Colors.END}")
                 return False
         
-        # temporary directory for building
-        with tempfile.TemporaryDirectory() as temp_dir:
-            old_cwd = os.getcwd()
-            try:
-                os.chdir(temp_dir)
-                
-                with ProgressIndicator(f"Cloning {helper} repository", self.config.get("show_progress")):
-                    success, _ = self.run_command(f"git clone https://aur.archlinux.org/{helper}.git")
-                    if not success:
-                        print(f"{Colors.RED}Failed to clone {helper} repository.{Colors.END}")
-                        return False
-                
-                os.chdir(helper)
-                
-                with ProgressIndicator(f"Building and installing {helper}", self.config.get("show_progress")):
-                    success, output = self.run_command("makepkg -si --noconfirm", capture_output=False)
-                    if not success:
-                        print(f"{Colors.RED}Failed to build/install {helper}.{Colors.END}")
-                        return False
-                
-                print(f"{Colors.GREEN}✅ {helper} installed successfully!{Colors.END}")
-                return True
-                
-            finally:
-                os.chdir(old_cwd)
+        if not self.build_aur_packages([helper]):
+            print(f"{Colors.RED}Failed to build/install {helper}.{Colors.END}")
+            return False
+        
+        print(f"{Colors.GREEN}✅ {helper} installed successfully!{Colors.END}")
+        return True
     
+    @profiled("build_aur_packages")
+    def build_aur_packages(self, packages: List[str]) -> bool:
+        """build and install AUR packages, independent ones in parallel"""
+        cache = None
+        if self.config.get("build_cache"):
+            cache = BuildCache(self.config.get("build_cache_dir", "~/.cache/aur-helper/build"),
+                               self.pacman_conf.architecture)
+        scheduler = BuildScheduler(self, self.config.get("max_build_jobs", 0), cache)
+        return scheduler.build(packages)
+    
+    @profiled("check_package_exists")
     def check_package_exists(self, manager: str, package: str) -> bool:
         """package exists in repositories?"""
         with ProgressIndicator(f"Checking if '{package}' exists", self.config.get("show_progress")):
-            # search patterns for better accuracy
+            if self.sync_index.available():
+                if self.sync_index.exists(package):
+                    return True
+                # only AUR helpers can still find it outside the sync databases
+                if not self.supported_managers[manager]["aur_support"]:
+                    return False
+            
+            if self.supported_managers[manager]["aur_support"] and self.config.get("use_aur_rpc"):
+                aur_info = self.aur.info([package])
+                if aur_info is not None:
+                    return package in aur_info
+            
+            # search patterns for better accuracy, all searched at once
             patterns = [f"^{package}$", f"^{package} ", f"/{package} "]
             
-            for pattern in patterns:
-                success, output = self.run_command(f"{manager} -Ss '{pattern}'")
-                if success and output:
-                    lines = output.splitlines()
+            with self.profiler.span("async_queries"):
+                results = self.queries.run([f"{manager} -Ss '{pattern}'" for pattern in patterns])
+            for result in results:
+                if result["success"] and result["output"]:
+                    lines = result["output"].splitlines()
                     for line in lines:
                         # More precise matching
                         if f"/{package} " in line or line.strip().endswith(f"/{package}"):
                             return True
         return False
     
-    def search_packages(self, manager: str, query: str) -> List[Dict[str, str]]:
-        """search with detailed information"""
-        success, output = self.run_command(f"{manager} -Ss {query}")
-        if not success or not output:
-            return []
+    @profiled("search_packages")
+    def search_packages(self, manager: str, query: str, table: Optional[PackageTable] = None) -> PackageTable:
+        """search with detailed information, appending to `table` when given"""
+        table = PackageTable() if table is None else table
+        table.extend(self.iter_search_packages(manager, query))
+        return table
+    
+    def iter_search_packages(self, manager: str, query: str) -> Iterator[Tuple[str, str, str, str]]:
+        """yield (name, repo, version, description) as the package manager prints them"""
+        pending = None
+        for line in self.stream_command(f"{manager} -Ss {query}"):
+            if line.startswith(" "):
+                # description belongs to the header right above it
+                if pending is not None:
+                    yield pending + (line.strip(),)
+                    pending = None
+                continue
+            
+            if pending is not None:
+                yield pending + ("",)
+                pending = None
+            
+            # repo/name version
+            parts = line.split()
+            if len(parts) >= 2 and "/" in parts[0]:
+                repo, name = parts[0].split("/", 1)
+                pending = (name, repo, parts[1])
         
-        packages = []
-        lines = output.splitlines()
-        i = 0
+        if pending is not None:
+            yield pending + ("",)
+    
+    @profiled("search_aur")
+    def search_aur(self, query: str, table: Optional[PackageTable] = None) -> Optional[PackageTable]:
+        """search the AUR over its RPC interface, None if it is unreachable"""
+        results = self.aur.search(query)
+        if results is None:
+            return None
+        table = PackageTable() if table is None else table
+        table.extend(
+            (pkg["Name"], "aur", pkg.get("Version", "unknown"), pkg.get("Description") or "")
+            for pkg in results
+        )
+        return table
+    
+    @profiled("get_repo_matcher")
+    def get_repo_matcher(self) -> FuzzyMatcher:
+        """fuzzy matcher over every sync database package, rebuilt when they change"""
+        self.sync_index.refresh()
+        if self._repo_matcher is None or self._repo_matcher_signature != self.sync_index._signature:
+            self._repo_matcher = FuzzyMatcher(sorted(self.sync_index.by_name))
+            self._repo_matcher_signature = self.sync_index._signature
+        return self._repo_matcher
+    
+    def find_similar(self, manager: str, query: str) -> Tuple[List[str], PackageTable]:
+        """best fuzzy matches for `query`, plus details for every package that was considered"""
+        max_results = self.config.get("max_search_results", 10)
+        cutoff = self.config.get("search_cutoff", 0.3)
+        scores = {}
+        packages = PackageTable()
         
-        while i < len(lines):
-            line = lines[i].strip()
-            if "/" in line and not line.startswith(" "):
-                try:
-                    # repo/name version
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        repo_package = parts[0]
-                        version = parts[1] if len(parts) > 1 else "unknown"
-                        
-                        if "/" in repo_package:
-                            repo, name = repo_package.split("/", 1)
-                            
-                            # description from next line if available
-                            description = ""
-                            if i + 1 < len(lines) and lines[i + 1].startswith(" "):
-                                description = lines[i + 1].strip()
-                            
-                            packages.append({
-                                "name": name,
-                                "repo": repo,
-                                "version": version,
-                                "description": description
-                            })
-                except (IndexError, ValueError):
-                    pass
-            i += 1
+        use_index = self.sync_index.available()
+        if use_index:
+            matcher = self.get_repo_matcher()
+            with self.profiler.span("fuzzy_match"):
+                repo_matches = matcher.scored(query, max_results, cutoff)
+            for score, name in repo_matches:
+                entry = self.sync_index.by_name[name][0]
+                packages.append(name, entry["repo"], entry["version"], entry["desc"])
+                scores[name] = score
         
-        return packages
+        # AUR results (or everything, without sync databases) come from the RPC or -Ss
+        if not use_index or self.supported_managers[manager]["aur_support"]:
+            # results land in the same table after the repo matches, which win on duplicates
+            if not (use_index and self.config.get("use_aur_rpc") and self.search_aur(query, packages) is not None):
+                self.search_packages(manager, query, packages)
+            with self.profiler.span("fuzzy_match"):
+                for score, name in FuzzyMatcher(packages.names).scored(query, max_results, cutoff):
+                    scores.setdefault(name, score)
+        
+        similar = [name for name, _ in heapq.nlargest(max_results, scores.items(), key=lambda item: (item[1], item[0]))]
+        return similar, packages
     
     def search_similar_interactive(self, manager: str, query: str) -> Optional[str]:
         """Enhanced interactive package search"""
         print(f"{Colors.BLUE}🔍 Searching for packages matching '{query}'...{Colors.END}")
         
-        packages = self.search_packages(manager, query)
+        similar, packages = self.find_similar(manager, query)
+        
         if not packages:
             print(f"{Colors.YELLOW}No packages found.{Colors.END}")
             return None
         
-        # remove duplicates and get fuzzy matches
-        unique_names = list(dict.fromkeys([pkg["name"] for pkg in packages]))
-        similar = get_close_matches(
-            query, 
-            unique_names, 
-            n=self.config.get("max_search_results", 10),
-            cutoff=self.config.get("search_cutoff", 0.3)
-        )
-        
         if not similar:
             print(f"{Colors.YELLOW}No similar packages found.{Colors.END}")
             return None
         
-        # create package lookup for detailed info
-        package_lookup = {pkg["name"]: pkg for pkg in packages}
-        
         print(f"\n{Colors.GREEN}📦 Similar packages found:{Colors.END}")
         print(f"{Colors.CYAN}{'No.':<4} {'Name':<25} {'Repo':<10} {'Description'}{Colors.END}")
         print("-" * 80)
         
         for i, name in enumerate(similar):
-            pkg = package_lookup.get(name, {"repo": "unknown", "description": ""})
+            pkg = packages.get(name, {"repo": "unknown", "description": ""})
             desc = pkg.get("description", "")[:40] + "..." if len(pkg.get("description", "")) > 40 else pkg.get("description", "")
             print(f"{Colors.WHITE}{i + 1:<4} {name:<25} {pkg.get('repo', 'unknown'):<10} {desc}{Colors.END}")
         
@@ -356,7 +2835,7 @@ class AURHelper:
             choice_num = int(choice)
             if 1 <= choice_num <= len(similar):
                 selected = similar[choice_num - 1]
-                pkg_info = package_lookup.get(selected, {})
+                pkg_info = packages.get(selected, {})
                 print(f"\n{Colors.GREEN}Selected: {selected} ({pkg_info.get('repo', 'unknown')})")
                 print(f"Description: {pkg_info.get('description', 'No description')}{Colors.END}")
                 return selected
@@ -368,59 +2847,185 @@ class AURHelper:
             print(f"{Colors.RED}Invalid input. Please enter a number.{Colors.END}")
             return None
     
-    def install_package(self, manager: str, package: str) -> bool:
-        if not self.validate_package_name(package):
-            print(f"{Colors.RED}Invalid package name: {package}{Colors.END}")
+    def validate_package_names(self, packages: Union[str, List[str]]) -> Optional[List[str]]:
+        """normalize to a de-duplicated list, None if any name is invalid"""
+        if isinstance(packages, str):
+            packages = [packages]
+        packages = list(dict.fromkeys(pkg for pkg in packages if pkg))
+        
+        invalid = [pkg for pkg in packages if not self.validate_package_name(pkg)]
+        if invalid:
+            print(f"{Colors.RED}Invalid package name{'s' if len(invalid) > 1 else ''}: {', '.join(invalid)}{Colors.END}")
+            return None
+        return packages
+    
+    @staticmethod
+    def describe_packages(packages: List[str]) -> str:
+        if len(packages) == 1:
+            return f"Package '{packages[0]}'"
+        return f"{len(packages)} packages"
+    
+    @profiled("install_package")
+    def install_package(self, manager: str, packages: Union[str, List[str]]) -> bool:
+        packages = self.validate_package_names(packages)
+        if not packages:
             return False
         
-        # already installed?
+        if self.config.get("show_install_plan"):
+            plan = self.plan_install(packages, manager)
+            if plan is not None:
+                self.show_install_plan(plan)
+        
+        # already installed? (one snapshot for the whole set)
         installed_packages = self.get_installed_packages()
-        if package in installed_packages:
-            print(f"{Colors.YELLOW}Package '{package}' is already installed.{Colors.END}")
+        reinstalls = [pkg for pkg in packages if pkg in installed_packages]
+        if reinstalls:
+            if len(reinstalls) == 1:
+                print(f"{Colors.YELLOW}Package '{reinstalls[0]}' is already installed.{Colors.END}")
+            else:
+                print(f"{Colors.YELLOW}Already installed: {', '.join(reinstalls)}{Colors.END}")
             if not self.config.get("auto_confirm"):
                 choice = input("Reinstall? (y/n): ").lower().strip()
                 if choice not in ['y', 'yes']:
-                    return False
+                    packages = [pkg for pkg in packages if pkg not in installed_packages]
+                    if not packages:
+                        return False
+        
+        # the package list is final now; downloads run while the backup is written
+        prefetch = self.start_prefetch(packages)
         
         # backup system state
-        backup_file = self.backup_system_state()
+        backup = self.backup_system_state()
+        self.finish_prefetch(prefetch)
         
-        # prepare install
-        if self.supported_managers[manager]["needs_sudo"]:
-            cmd = f"sudo {manager} -S {package}"
-        else:
-            cmd = f"{manager} -S {package}"
+        # AUR targets go to the build scheduler, which builds independent ones in
+        # parallel; the manager keeps the repository packages in one transaction
+        aur_targets = []
+        if self.supported_managers[manager]["aur_support"] and self.sync_index.available():
+            aur_targets = [pkg for pkg in packages if not self.sync_index.exists(pkg)]
+        repo_targets = [pkg for pkg in packages if pkg not in aur_targets]
+        targets = " ".join(packages)
         
-        if self.config.get("auto_confirm"):
-            cmd += " --noconfirm"
+        start = time.time()
+        success = True
+        if repo_targets:
+            if self.supported_managers[manager]["needs_sudo"]:
+                cmd = f"sudo {manager} -S {' '.join(repo_targets)}"
+            else:
+                cmd = f"{manager} -S {' '.join(repo_targets)}"
+            
+            if self.config.get("auto_confirm"):
+                cmd += " --noconfirm"
+            
+            print(f"{Colors.BLUE}📦 Installing {', '.join(repo_targets)} with {manager}...{Colors.END}")
+            success, output = self.run_command(cmd, capture_output=False)
         
-        print(f"{Colors.BLUE}📦 Installing {package} with {manager}...{Colors.END}")
+        if success and aur_targets:
+            print(f"{Colors.BLUE}🔨 Building {', '.join(aur_targets)} from the AUR...{Colors.END}")
+            success = self.build_aur_packages(aur_targets)
         
-        success, output = self.run_command(cmd, capture_output=False)
+        self.record_operation("install", packages, manager, None, start, success, backup)
         
         if success:
-            print(f"{Colors.GREEN}✅ Package '{package}' installed successfully!{Colors.END}")
-            self.logger.info(f"Successfully installed package: {package}")
+            print(f"{Colors.GREEN}✅ {self.describe_packages(packages)} installed successfully!{Colors.END}")
+            self.logger.info(f"Successfully installed packages: {targets}")
             return True
         else:
-            print(f"{Colors.RED}❌ Failed to install package '{package}'.{Colors.END}")
-            self.logger.error(f"Failed to install package: {package}")
-            if backup_file:
-                print(f"{Colors.YELLOW}System backup available at: {backup_file}{Colors.END}")
+            print(f"{Colors.RED}❌ Failed to install {self.describe_packages(packages).lower()}.{Colors.END}")
+            self.logger.error(f"Failed to install packages: {targets}")
+            if backup:
+                self.show_backup_hint(backup)
             return False
     
-    def remove_package(self, manager: str, package: str, mode: str = "simple") -> bool:
-        """remove package"""
-        if not self.validate_package_name(package):
-            print(f"{Colors.RED}Invalid package name: {package}{Colors.END}")
+    @profiled("plan_install")
+    def plan_install(self, packages: List[str], manager: str) -> Optional[Dict[str, object]]:
+        """dependency closure and sizes of an install, None without local and sync databases"""
+        if not (self.local_db.available() and self.sync_index.available()):
+            return None
+        self.sync_index.refresh()
+        self.local_db.packages()
+        # resolutions stay valid until either database changes
+        signature = (self.sync_index._signature, self.local_db._mtime)
+        if self._install_planner is None or self._install_planner_signature != signature:
+            self._install_planner = InstallPlanner(self.local_db, self.sync_index, self.pacman_conf, self.aur)
+            self._install_planner_signature = signature
+        # a manager without AUR support can't install AUR packages, so don't ask the AUR
+        return self._install_planner.plan(packages, offline=not self.config.get("use_aur_rpc"),
+                                          include_aur=self.supported_managers[manager]["aur_support"])
+    
+    def show_install_plan(self, plan: Dict[str, object]):
+        packages = plan["packages"]
+        dependencies = [pkg for pkg in packages if pkg["dependency"]]
+        print(f"{Colors.CYAN}📋 {len(packages)} packages ({len(dependencies)} dependencies), "
+              f"{format_size(plan['download_size'])} to download, "
+              f"{format_size(plan['installed_size'])} installed{Colors.END}")
+        for source, totals in sorted(plan["sources"].items(), key=lambda item: item[0] == "aur"):
+            if source == "aur":
+                print(f"   {source:<12} {totals['packages']:>4} packages  built from source")
+            else:
+                print(f"   {source:<12} {totals['packages']:>4} packages  {format_size(totals['download_size']):>10} download"
+                      f"  {format_size(totals['installed_size']):>10} installed")
+        if plan["build_order"]:
+            steps = " → ".join(", ".join(layer) for layer in plan["build_order"])
+            print(f"   AUR build order: {steps}")
+        if plan["missing"]:
+            print(f"{Colors.RED}   Cannot resolve: {', '.join(plan['missing'])}{Colors.END}")
+        if not plan["aur_complete"]:
+            print(f"{Colors.YELLOW}   AUR metadata unavailable, the plan may be incomplete{Colors.END}")
+    
+    @profiled("analyze_removal")
+    def analyze_removal(self, packages: List[str], mode: str = "simple") -> Optional[Dict[str, object]]:
+        """cascade, freed size and broken dependents of a removal, None without a local database"""
+        if mode not in ("simple", "full", "purge") or not self.local_db.available():
+            return None
+        # every mode runs pacman -Rns, so every mode takes unused dependencies along
+        impact = self.local_db.graph().removal(packages, recursive=True)
+        impact["mode"] = mode
+        impact["targets"] = packages
+        return impact
+    
+    def show_removal_impact(self, impact: Dict[str, object]):
+        if impact["not_found"]:
+            for name in impact["not_found"]:
+                print(f"{Colors.RED}error: target not found: {name}{Colors.END}")
+            return
+        extra = [name for name in impact["remove"] if name not in impact["targets"]]
+        print(f"{Colors.CYAN}📋 {len(impact['remove'])} packages will be removed, "
+              f"freeing {format_size(impact['freed'])}{Colors.END}")
+        if extra:
+            shown = ", ".join(extra[:10]) + (f" ... and {len(extra) - 10} more" if len(extra) > 10 else "")
+            print(f"   Unused dependencies: {shown}")
+        for name, users in impact["optional"].items():
+            print(f"{Colors.YELLOW}   {name} is an optional dependency of {', '.join(users)}{Colors.END}")
+        for name, dependents in impact["blockers"].items():
+            print(f"{Colors.RED}   {name} is required by {', '.join(dependents)}{Colors.END}")
+    
+    @profiled("remove_package")
+    def remove_package(self, manager: str, packages: Union[str, List[str]], mode: str = "simple") -> bool:
+        """remove packages in one transaction"""
+        packages = self.validate_package_names(packages)
+        if not packages:
             return False
         
         installed_packages = self.get_installed_packages()
-        if package not in installed_packages:
-            print(f"{Colors.YELLOW}Package '{package}' is not installed.{Colors.END}")
+        missing = [pkg for pkg in packages if pkg not in installed_packages]
+        if missing:
+            if len(missing) == 1:
+                print(f"{Colors.YELLOW}Package '{missing[0]}' is not installed.{Colors.END}")
+            else:
+                print(f"{Colors.YELLOW}Not installed: {', '.join(missing)}{Colors.END}")
             return False
         
-        backup_file = self.backup_system_state()
+        impact = self.analyze_removal(packages, mode)
+        if impact is not None:
+            self.show_removal_impact(impact)
+            if impact["blockers"]:
+                print(f"{Colors.RED}❌ Removal would break the packages above; remove them too "
+                      f"or use a different mode.{Colors.END}")
+                self.logger.error(f"Removal blocked by dependents: {impact['blockers']}")
+                return False
+        
+        backup = self.backup_system_state()
         
         mode_descriptions = {
             "simple": "Remove package only",
@@ -428,43 +3033,205 @@ class AURHelper:
             "purge": "Remove package, dependencies, and clean cache"
         }
         
-        print(f"{Colors.BLUE}🗑️  Removing {package} ({mode_descriptions.get(mode, mode)})...{Colors.END}")
+        targets = " ".join(packages)
+        print(f"{Colors.BLUE}🗑️  Removing {', '.join(packages)} ({mode_descriptions.get(mode, mode)})...{Colors.END}")
         
         if mode in ["simple", "full", "purge"]:
+            start = time.time()
             success, output = self.run_command(
-                f"sudo pacman -Rns {package}" + (" --noconfirm" if self.config.get("auto_confirm") else ""),
+                f"sudo pacman -Rns {targets}" + (" --noconfirm" if self.config.get("auto_confirm") else ""),
                 capture_output=False
             )
+            self.record_operation("remove", packages, manager, mode, start, success, backup)
             
             if success:
-                print(f"{Colors.GREEN}✅ Package '{package}' removed successfully!{Colors.END}")
-                self.logger.info(f"Successfully removed package: {package}")
+                print(f"{Colors.GREEN}✅ {self.describe_packages(packages)} removed successfully!{Colors.END}")
+                self.logger.info(f"Successfully removed packages: {targets}")
                 
                 if mode == "purge":
                     print(f"{Colors.BLUE}🧹 Cleaning package cache...{Colors.END}")
-                    clean_success, _ = self.run_command(
-                        "sudo pacman -Sc" + (" --noconfirm" if self.config.get("auto_confirm") else ""),
-                        capture_output=False
-                    )
-                    if clean_success:
-                        print(f"{Colors.GREEN}✅ Package cache cleaned successfully!{Colors.END}")
+                    report = self.clean_package_cache()
+                    if report["removed"]:
+                        print(f"{Colors.GREEN}✅ Removed {len(report['removed'])} cached files, "
+                              f"{format_size(report['freed'])} reclaimed "
+                              f"({report['kept']} kept for rollback).{Colors.END}")
                     else:
-                        print(f"{Colors.YELLOW}⚠️  Failed to clean package cache.{Colors.END}")
+                        print(f"{Colors.GREEN}✅ Package cache is already clean.{Colors.END}")
                 
                 return True
             else:
-                print(f"{Colors.RED}❌ Failed to remove package '{package}'.{Colors.END}")
-                self.logger.error(f"Failed to remove package: {package}")
-                if backup_file:
-                    print(f"{Colors.YELLOW}System backup available at: {backup_file}{Colors.END}")
+                print(f"{Colors.RED}❌ Failed to remove {self.describe_packages(packages).lower()}.{Colors.END}")
+                self.logger.error(f"Failed to remove packages: {targets}")
+                if backup:
+                    self.show_backup_hint(backup)
                 return False
         else:
             print(f"{Colors.RED}❌ Unknown removal mode '{mode}'.{Colors.END}")
             return False
     
+    @profiled("plan_upgrades")
+    def plan_upgrades(self, include_aur: bool = False) -> Optional[Dict[str, object]]:
+        """pending upgrades from the local and sync databases, None without them"""
+        if not (self.local_db.available() and self.sync_index.available()):
+            return None
+        planner = UpgradePlanner(self.local_db, self.sync_index, self.pacman_conf, self.aur)
+        return planner.plan(include_aur)
+    
+    def show_upgrade_plan(self, plan: Dict[str, object]):
+        upgrades = plan["upgrades"]
+        print(f"{Colors.CYAN}{'Package':<30} {'Old version':<18} {'New version':<18} {'Repo':<10} {'Download'}{Colors.END}")
+        for upgrade in upgrades[:50]:
+            size = format_size(upgrade["download_size"]) if upgrade["repo"] != "aur" else "build"
+            print(f"{upgrade['name']:<30} {upgrade['old']:<18} {upgrade['new']:<18} {upgrade['repo']:<10} {size}")
+        if len(upgrades) > 50:
+            print(f"  ... and {len(upgrades) - 50} more")
+        print(f"{Colors.BOLD}{len(upgrades)} upgrades, {format_size(plan['download_size'])} to download, "
+              f"{format_size(plan['size_change'])} installed size change{Colors.END}")
+    
+    def start_prefetch(self, targets: Optional[List[str]]):
+        """start downloading package files in the background, None when prefetching is off"""
+        if not self.config.get("prefetch_downloads") or not self.sync_index.available():
+            return None
+        cache_dir = self.pacman_conf.cache_dirs[0]
+        if not os.access(cache_dir, os.W_OK):
+            return None
+        return Prefetcher(self, cache_dir, self.config.get("download_jobs", 4)).start(targets)
+    
+    def finish_prefetch(self, prefetch):
+        if prefetch is None:
+            return
+        with self.profiler.span("prefetch_wait"):
+            summary = prefetch.result()
+        if summary["files"]:
+            print(f"{Colors.BLUE}📥 Prefetched {summary['downloaded']} package files "
+                  f"({format_size(summary['bytes'])}, {summary['cached']} already cached"
+                  + (f", {summary['failed']} failed" if summary["failed"] else "")
+                  + f") in {summary['seconds']:.1f}s{Colors.END}")
+            self.logger.info(f"Prefetch finished: {summary}")
+    
+    @profiled("clean_package_cache")
+    def clean_package_cache(self, dry_run: bool = False) -> Optional[Dict[str, object]]:
+        """prune old package versions from the cache, keeping recent ones for rollback"""
+        cache = CacheManager(
+            self.pacman_conf.cache_dirs,
+            self.config.get("cache_keep_versions", 3),
+            self.config.get("cache_keep_uninstalled", 0),
+            self.config.get("cache_max_size_mb", 0) * 1024 * 1024
+        )
+        
+        if self.local_db.available():
+            installed = {name: info["version"] for name, info in self.local_db.packages().items()}
+        else:
+            installed = {name: "" for name in self.get_installed_packages()}
+        
+        start = time.time()
+        remove, keep = cache.plan(installed)
+        reclaimable = sum(item["size"] for item in remove)
+        report = {
+            "files": len(remove) + len(keep),
+            "removed": [os.path.basename(item["path"]) for item in remove],
+            "freed": 0,
+            "kept": len(keep),
+            "kept_size": sum(item["size"] for item in keep),
+            "dry_run": dry_run
+        }
+        
+        if remove and not dry_run:
+            freed, denied = cache.remove(remove)
+            for i in range(0, len(denied), 200):
+                batch = " ".join(shlex.quote(path) for path in denied[i:i + 200])
+                success, _ = self.run_command(f"sudo rm -f -- {batch}")
+                if not success:
+                    break
+            else:
+                freed = reclaimable
+            report["freed"] = freed
+        elif dry_run:
+            report["freed"] = reclaimable
+        
+        self.logger.info(f"Package cache pruned: {len(remove)} files, {format_size(report['freed'])} "
+                         f"in {time.time() - start:.2f}s", dry_run=dry_run)
+        return report
+    
+    @profiled("refresh_databases")
+    def refresh_databases(self) -> bool:
+        """refresh every sync database in-process; False means fall back to pacman -Syy"""
+        db_path = self.config.get("pacman_db_path", "/var/lib/pacman")
+        sync_dir = os.path.join(db_path, "sync")
+        # the lock file is created in DBPath itself
+        if not self.pacman_conf.repos or not os.access(sync_dir, os.W_OK) or not os.access(db_path, os.W_OK):
+            return False
+        
+        refresher = SyncRefresher(
+            self.pacman_conf,
+            sync_dir,
+            mirrors=self.config.get("mirrors", []),
+            jobs=self.config.get("refresh_jobs", 4),
+            logger=self.logger
+        )
+        print(f"{Colors.BLUE}🔄 Refreshing {len(self.pacman_conf.repos)} package databases...{Colors.END}")
+        results = refresher.refresh()
+        if results is None:
+            print(f"{Colors.YELLOW}{refresher.lock_file} exists, another pacman is running. "
+                  f"Skipping the parallel refresh.{Colors.END}")
+            self.logger.warning(f"Database refresh skipped, {refresher.lock_file} is held")
+            return False
+        
+        for result in results:
+            if result["status"] == "updated":
+                print(f"  {Colors.GREEN}✓{Colors.END} {result['repo']:<12} {format_size(result['bytes']):>10} "
+                      f"from {urllib.parse.urlsplit(result['mirror']).netloc} ({result['seconds']:.1f}s)")
+            elif result["status"] == "unchanged":
+                print(f"  {Colors.GREEN}✓{Colors.END} {result['repo']:<12} {'up to date':>10}")
+            else:
+                print(f"  {Colors.RED}✗{Colors.END} {result['repo']:<12} {'failed':>10}")
+        
+        success = all(result["status"] != "failed" for result in results)
+        self.logger.info(f"Database refresh {'completed' if success else 'failed'}: "
+                         + ", ".join(f"{r['repo']}={r['status']}" for r in results))
+        return success
+    
+    def update_covers_aur(self, manager: str, mode: str) -> bool:
+        """whether the update commands for `mode` also upgrade AUR packages"""
+        if self.supported_managers[manager]["aur_support"]:
+            return True
+        # full and force fall back to whichever AUR helper is installed
+        return mode in ("full", "force") and (self.is_installed("yay") or self.is_installed("paru"))
+    
+    @profiled("update_system")
     def update_system(self, manager: str, mode: str = "standard") -> bool:
         """update system packags"""
-        backup_file = self.backup_system_state()
+        prefetch = None
+        if mode in ("standard", "full"):
+            plan = self.plan_upgrades(self.update_covers_aur(manager, mode))
+            if plan is not None:
+                planner_age = UpgradePlanner(self.local_db, self.sync_index, self.pacman_conf).databases_age()
+                fresh = planner_age is not None and planner_age < self.config.get("update_plan_max_age", 3600)
+                if plan["upgrades"]:
+                    print(f"\n{Colors.BOLD}{Colors.CYAN}📋 Pending upgrades:{Colors.END}")
+                    self.show_upgrade_plan(plan)
+                    if fresh:
+                        prefetch = self.start_prefetch(None)
+                elif fresh and plan["aur_complete"] and self.config.get("skip_empty_updates"):
+                    print(f"{Colors.GREEN}✅ System is up to date, nothing to do.{Colors.END}")
+                    self.logger.info(f"Update skipped, no pending upgrades (mode: {mode})")
+                    return True
+        
+        refreshed = False
+        if mode in ("refresh", "force") and self.config.get("parallel_refresh"):
+            refreshed = self.refresh_databases()
+            if refreshed:
+                plan = self.plan_upgrades(self.update_covers_aur(manager, mode))
+                if plan is not None and plan["upgrades"]:
+                    print(f"\n{Colors.BOLD}{Colors.CYAN}📋 Pending upgrades:{Colors.END}")
+                    self.show_upgrade_plan(plan)
+                    prefetch = self.start_prefetch(None)
+                elif plan is not None and plan["aur_complete"] and self.config.get("skip_empty_updates"):
+                    print(f"{Colors.GREEN}✅ System is up to date, nothing to do.{Colors.END}")
+                    self.logger.info(f"Update skipped after refresh, no pending upgrades (mode: {mode})")
+                    return True
+        
+        backup = self.backup_system_state()
         
         mode_descriptions = {
             "standard": "Update official repository packages",
@@ -515,10 +3282,17 @@ class AURHelper:
             print(f"{Colors.RED}❌ Unknown update mode '{mode}'.{Colors.END}")
             return False
         
+        self.finish_prefetch(prefetch)
+        
+        if refreshed:
+            # databases are already current, only the upgrade itself is left
+            commands = [re.sub(r' -Sy{1,2}u$', ' -Su', cmd) for cmd in commands]
+        
         if self.config.get("auto_confirm"):
             commands = [cmd + " --noconfirm" for cmd in commands]
         
         all_success = True
+        start = time.time()
         for i, cmd in enumerate(commands):
             if len(commands) > 1:
                 print(f"{Colors.CYAN}Step {i+1}/{len(commands)}: {cmd.split()[0]}{Colors.END}")
@@ -531,13 +3305,15 @@ class AURHelper:
                 all_success = False
                 break
         
+        self.record_operation("update", [], manager, mode, start, all_success, backup)
+        
         if all_success:
             print(f"{Colors.GREEN}✅ System update completed successfully!{Colors.END}")
             self.logger.info(f"System update completed successfully with mode: {mode}")
             
-            orphaned_success, orphaned_output = self.run_command("pacman -Qtdq")
-            if orphaned_success and orphaned_output.strip():
-                print(f"{Colors.YELLOW}📦 Found orphaned packages: {len(orphaned_output.strip().split())} packages{Colors.END}")
+            orphans = self.find_orphans()
+            if orphans:
+                print(f"{Colors.YELLOW}📦 Found orphaned packages: {len(orphans)} packages{Colors.END}")
                 if not self.config.get("auto_confirm"):
                     choice = input(f"{Colors.YELLOW}Remove orphaned packages? (y/n): {Colors.END}").strip().lower()
                     if choice in ['y', 'yes']:
@@ -546,24 +3322,35 @@ class AURHelper:
             return True
         else:
             print(f"{Colors.RED}❌ System update failed!{Colors.END}")
-            if backup_file:
-                print(f"{Colors.YELLOW}System backup available at: {backup_file}{Colors.END}")
+            if backup:
+                self.show_backup_hint(backup)
             return False
     
+    def find_orphans(self) -> Optional[List[str]]:
+        """every orphaned package including the ones only other orphans depend on, None on failure"""
+        if self.local_db.available():
+            return self.local_db.graph().orphans(self.config.get("orphans_keep_optional", True))
+        
+        success, output = self.run_command("pacman -Qtdq")
+        if not success:
+            # pacman exits 1 when there is nothing to list
+            return [] if not output.strip() else None
+        return output.split()
+    
+    @profiled("remove_orphaned_packages")
     def remove_orphaned_packages(self) -> bool:
         """Remove orphaned packages from the system"""
         print(f"{Colors.BLUE}🧹 Checking for orphaned packages...{Colors.END}")
         
-        success, output = self.run_command("pacman -Qtdq")
-        if not success:
+        orphaned_packages = self.find_orphans()
+        if orphaned_packages is None:
             print(f"{Colors.RED}❌ Failed to check for orphaned packages.{Colors.END}")
             return False
         
-        if not output.strip():
+        if not orphaned_packages:
             print(f"{Colors.GREEN}✅ No orphaned packages found.{Colors.END}")
             return True
         
-        orphaned_packages = output.strip().split('\n')
         print(f"{Colors.YELLOW}Found {len(orphaned_packages)} orphaned packages:{Colors.END}")
         
         for pkg in orphaned_packages[:10]:
@@ -578,13 +3365,16 @@ class AURHelper:
                 print(f"{Colors.BLUE}Orphaned package removal cancelled.{Colors.END}")
                 return False
         
-        backup_file = self.backup_system_state()
+        backup = self.backup_system_state()
         
-        remove_cmd = "sudo pacman -Rns $(pacman -Qtdq)"
+        # the exact list shown above, in one transaction
+        remove_cmd = f"sudo pacman -Rns {' '.join(orphaned_packages)}"
         if self.config.get("auto_confirm"):
             remove_cmd += " --noconfirm"
         
+        start = time.time()
         success, output = self.run_command(remove_cmd, capture_output=False)
+        self.record_operation("remove-orphans", orphaned_packages, "pacman", None, start, success, backup)
         
         if success:
             print(f"{Colors.GREEN}✅ Orphaned packages removed successfully!{Colors.END}")
@@ -593,8 +3383,8 @@ class AURHelper:
         else:
             print(f"{Colors.RED}❌ Failed to remove orphaned packages.{Colors.END}")
             self.logger.error("Failed to remove orphaned packages")
-            if backup_file:
-                print(f"{Colors.YELLOW}System backup available at: {backup_file}{Colors.END}")
+            if backup:
+                self.show_backup_hint(backup)
             return False
             print(f"{Colors.RED}❌ Unknown removal mode '{mode}'.{Colors.END}")
             return False
@@ -709,20 +3499,36 @@ class AURHelper:
         installed_packages = self.get_installed_packages()
         print(f"📦 Installed packages: {len(installed_packages)}")
         
+        available = [manager for manager in self.supported_managers if self.is_installed(manager)]
+        queries = ["pacman -Qmq"] + [f"{manager} --version" for manager in available]
+        with self.profiler.span("async_queries"):
+            foreign, *versions = self.queries.run(queries)
+        versions = dict(zip(available, versions))
+        
+        orphans = self.find_orphans()
+        if orphans is not None:
+            print(f"🧹 Orphaned packages: {len(orphans)}")
+        if foreign["returncode"] is not None:
+            print(f"🌐 Foreign (AUR/local) packages: {len(foreign['output'].split())}")
+        
         print(f"\n{Colors.BOLD}Available Package Managers:{Colors.END}")
         for manager, info in self.supported_managers.items():
-            status = "✅ Installed" if self.is_installed(manager) else "❌ Not installed"
-            print(f"  {info['name']}: {status}")
+            if manager in versions:
+                version = re.search(r'\bv(\d+\.\d+[\w.]*)', versions[manager]["output"])
+                version = f" (v{version.group(1)})" if versions[manager]["success"] and version else ""
+                print(f"  {info['name']}: ✅ Installed{version}")
+            else:
+                print(f"  {info['name']}: ❌ Not installed")
         
-        try:
-            if os.path.exists(self.logger.log_file):
-                print(f"\n{Colors.BOLD}Recent Operations:{Colors.END}")
-                with open(self.logger.log_file, 'r') as f:
-                    lines = f.readlines()[-5:]  # Last 5 operations
-                    for line in lines:
-                        print(f"  {line.strip()}")
-        except Exception:
-            pass
+        operations = self.journal.tail(5)
+        if operations:
+            print(f"\n{Colors.BOLD}Recent Operations:{Colors.END}")
+            for op in operations:
+                status = "✅" if op.get("success") else "❌"
+                mode = f" ({op['mode']})" if op.get("mode") else ""
+                packages = ", ".join(op.get("packages") or [])
+                print(f"  [{op.get('time', '?')}] {status} {op.get('operation')}{mode} "
+                      f"{packages} via {op.get('manager')} in {op.get('duration', 0):.1f}s")
         
         input(f"\n{Colors.YELLOW}Press Enter to continue...{Colors.END}")
     
@@ -750,30 +3556,33 @@ class AURHelper:
                         break
                     
                     if action == "1":
-                        package = input(f"\n{Colors.YELLOW}Enter package name to install: {Colors.END}").strip()
-                        if package:
+                        packages = input(f"\n{Colors.YELLOW}Enter package name(s) to install: {Colors.END}").split()
+                        targets = []
+                        for package in packages:
                             if not self.check_package_exists(manager, package):
                                 package = self.search_similar_interactive(manager, package)
                                 if not package:
                                     continue
-                            self.install_package(manager, package)
+                            targets.append(package)
+                        if targets:
+                            self.install_package(manager, targets)
                     
                     elif action == "2":
-                        package = input(f"\n{Colors.YELLOW}Enter package name to remove: {Colors.END}").strip()
-                        if package:
-                            self.remove_package(manager, package, "simple")
+                        packages = input(f"\n{Colors.YELLOW}Enter package name(s) to remove: {Colors.END}").split()
+                        if packages:
+                            self.remove_package(manager, packages, "simple")
                     
                     elif action == "3":
-                        package = input(f"\n{Colors.YELLOW}Enter package name to remove: {Colors.END}").strip()
-                        if package:
-                            self.remove_package(manager, package, "full")
+                        packages = input(f"\n{Colors.YELLOW}Enter package name(s) to remove: {Colors.END}").split()
+                        if packages:
+                            self.remove_package(manager, packages, "full")
                     
                     elif action == "4":
-                        package = input(f"\n{Colors.YELLOW}Enter package name to purge: {Colors.END}").strip()
-                        if package:
+                        packages = input(f"\n{Colors.YELLOW}Enter package name(s) to purge: {Colors.END}").split()
+                        if packages:
                             print(f"{Colors.RED}Warning: This will remove the package, dependencies, and clean cache!{Colors.END}")
                             if self.config.get("auto_confirm") or input("Continue? (y/n): ").lower().strip() in ['y', 'yes']:
-                                self.remove_package(manager, package, "purge")
+                                self.remove_package(manager, packages, "purge")
                     
                     elif action == "5":
                         print(f"\n{Colors.BOLD}{Colors.CYAN}🔄 System Update Options:{Colors.END}")
@@ -815,13 +3624,685 @@ class AURHelper:
             self.logger.error(f"Unexpected error: {e}")
 
 
+def default_socket_path(config: Config) -> str:
+    if config.get("daemon_socket"):
+        return os.path.expanduser(config.get("daemon_socket"))
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "aur-helper.sock")
+    return os.path.expanduser("~/.cache/aur-helper/daemon.sock")
+
+
+class PackageDaemon:
+    """keeps the package indexes warm and answers read-only queries over a Unix socket"""
+    
+    def __init__(self, helper: "AURHelper", socket_path: str, poll_interval: float = 1.0):
+        self.helper = helper
+        self.socket_path = socket_path
+        self.poll_interval = poll_interval
+        self.server = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+    
+    def warm(self):
+        """load (or reload) everything a query could need"""
+        with self._lock:
+            self.helper.get_installed_packages()
+            if self.helper.sync_index.available():
+                self.helper.get_repo_matcher()
+    
+    def _signature(self) -> Tuple:
+        db_path = self.helper.config.get("pacman_db_path", "/var/lib/pacman")
+        signature = []
+        for sub_dir in ("local", "sync"):
+            try:
+                signature.append(os.stat(os.path.join(db_path, sub_dir)).st_mtime_ns)
+                with os.scandir(os.path.join(db_path, sub_dir)) as entries:
+                    signature.extend(
+                        (entry.name, entry.stat().st_mtime_ns) for entry in entries if entry.name.endswith(".db")
+                    )
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+    
+    def _watch(self):
+        signature = self._signature()
+        while not self._stop.wait(self.poll_interval):
+            current = self._signature()
+            if current != signature:
+                signature = current
+                self.helper.logger.info("Package databases changed, refreshing daemon caches")
+                self.warm()
+            self.helper.logger.flush()
+    
+    def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        manager = request.get("manager") or self.helper.config.get("default_manager", "pacman")
+        if manager not in self.helper.supported_managers:
+            return {"ok": False, "error": f"unknown manager '{manager}'"}
+        
+        with self._lock:
+            if op == "ping":
+                return {"ok": True, "pid": os.getpid()}
+            if op == "exists":
+                packages = request.get("packages", [])
+                return {"ok": True, "exists": {
+                    package: self.helper.check_package_exists(manager, package) for package in packages
+                }}
+            if op == "installed":
+                installed = self.helper.get_installed_packages()
+                packages = request.get("packages")
+                if packages is None:
+                    return {"ok": True, "count": len(installed)}
+                return {"ok": True, "installed": {package: package in installed for package in packages}}
+            if op == "search":
+                similar, packages = self.helper.find_similar(manager, request.get("query", ""))
+                return {"ok": True, "results": [packages[name].as_dict() for name in similar]}
+            if op == "info":
+                local = self.helper.local_db.packages()
+                return {"ok": True, "packages": {
+                    package: {
+                        "installed": local.get(package),
+                        "repositories": self.helper.sync_index.find(package) if self.helper.sync_index.available() else []
+                    }
+                    for package in request.get("packages", [])
+                }}
+        return {"ok": False, "error": f"unknown operation '{op}'"}
+    
+    def serve(self):
+        daemon = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = daemon.handle(json.loads(line))
+                    except Exception as e:
+                        response = {"ok": False, "error": str(e)}
+                    self.wfile.write((json.dumps(response) + "\n").encode())
+                    self.wfile.flush()
+        
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        if os.path.exists(self.socket_path):
+            if DaemonClient(self.socket_path).request("ping") is not None:
+                print(f"{Colors.YELLOW}A daemon is already listening on {self.socket_path}{Colors.END}")
+                return
+            os.remove(self.socket_path)
+        
+        self.helper.config.config["show_progress"] = False
+        self.warm()
+        
+        socketserver.ThreadingUnixStreamServer.daemon_threads = True
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        os.chmod(self.socket_path, 0o600)
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=self.server.shutdown).start())
+        
+        watcher = threading.Thread(target=self._watch, daemon=True)
+        watcher.start()
+        print(f"{Colors.GREEN}aur-helper daemon listening on {self.socket_path}{Colors.END}")
+        self.helper.logger.info(f"Daemon started on {self.socket_path}")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            self.server.server_close()
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+            self.helper.logger.info("Daemon stopped")
+            self.helper.logger.flush()
+
+
+class DaemonClient:
+    """thin client for PackageDaemon; every call returns None when no daemon answers"""
+    
+    def __init__(self, socket_path: str, timeout: float = 5.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+    
+    def request(self, op: str, **params) -> Optional[dict]:
+        if not os.path.exists(self.socket_path):
+            return None
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                sock.sendall((json.dumps({"op": op, **params}) + "\n").encode())
+                with sock.makefile('rb') as f:
+                    response = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        return response if response.get("ok") else None
+
+
+class FleetExecutor(abc.ABC):
+    """runs an aur-helper command line on one host; subclasses say how to reach it"""
+    
+    def __init__(self, timeout: int = 3600):
+        self.timeout = timeout
+    
+    @abc.abstractmethod
+    def command(self, host: str, argv: List[str]) -> List[str]:
+        """argv that runs `argv` as aur-helper arguments on `host`"""
+    
+    def supports(self, operation: argparse.Namespace) -> bool:
+        return True
+    
+    def run(self, host: str, argv: List[str]) -> Dict[str, object]:
+        start = time.time()
+        result = {"host": host, "success": False, "returncode": None, "result": None, "error": ""}
+        try:
+            process = subprocess.run(self.command(host, argv), capture_output=True, text=True,
+                                     timeout=self.timeout, stdin=subprocess.DEVNULL)
+            result["returncode"] = process.returncode
+            result["success"] = process.returncode == 0
+            try:
+                result["result"] = json.loads(process.stdout)
+            except ValueError:
+                pass
+            if not result["success"]:
+                lines = process.stderr.strip().splitlines()
+                result["error"] = lines[-1] if lines else f"exit code {process.returncode}"
+        except subprocess.TimeoutExpired:
+            result["error"] = f"timed out after {self.timeout}s"
+        except OSError as e:
+            result["error"] = str(e)
+        result["duration"] = time.time() - start
+        return result
+
+
+class SSHExecutor(FleetExecutor):
+    """aur-helper on the remote host over non-interactive ssh"""
+    
+    def __init__(self, remote_command: str = "aur-helper", ssh_options: List[str] = None, timeout: int = 3600):
+        super().__init__(timeout)
+        self.remote_command = remote_command
+        self.ssh_options = ssh_options or []
+    
+    def command(self, host: str, argv: List[str]) -> List[str]:
+        return ["ssh", *self.ssh_options, host, " ".join([self.remote_command] + [shlex.quote(arg) for arg in argv])]
+
+
+class LocalExecutor(FleetExecutor):
+    """this script as a local process per host, for trying out fleet runs
+    
+    Every "host" is this machine, so only operations that change nothing are
+    allowed; real transactions would fight over the pacman lock.
+    """
+    
+    def command(self, host: str, argv: List[str]) -> List[str]:
+        return [sys.executable, os.path.abspath(__file__), *argv]
+    
+    def supports(self, operation: argparse.Namespace) -> bool:
+        command = operation.command
+        if command in ("search", "info", "exists", "backup"):
+            return True
+        return bool(
+            (command == "install" and operation.plan)
+            or (command in ("remove", "clean") and operation.dry_run)
+            or (command == "orphans" and not operation.remove)
+        )
+
+
+def load_inventory(path: str) -> List[str]:
+    """host names, one per line; blank lines and # comments are skipped"""
+    hosts = []
+    with open(os.path.expanduser(path), 'r') as f:
+        for line in f:
+            host = line.split("#", 1)[0].strip()
+            if host and host not in hosts:
+                hosts.append(host)
+    return hosts
+
+
+class FleetRunner:
+    """one operation across many hosts, a bounded number at a time"""
+    
+    def __init__(self, executor: FleetExecutor, jobs: int = 10, max_failure_rate: float = 0.25):
+        self.executor = executor
+        self.jobs = max(1, jobs)
+        self.max_failure_rate = max_failure_rate
+        self.results = []
+        self.skipped = []
+        self.stopped_early = False
+        self.seconds = 0.0
+    
+    def should_stop(self) -> bool:
+        failed = sum(1 for result in self.results if not result["success"])
+        # judge the rate only once a first wave has finished
+        return (failed > 0 and len(self.results) >= min(self.jobs, 5)
+                and failed / len(self.results) > self.max_failure_rate)
+    
+    def run(self, hosts: List[str], argv: List[str]) -> Iterator[Dict[str, object]]:
+        """yield each host's result as it finishes"""
+        start = time.time()
+        pending = list(hosts)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while pending or running:
+                while pending and len(running) < self.jobs and not self.stopped_early:
+                    host = pending.pop(0)
+                    running[executor.submit(self.executor.run, host, argv)] = host
+                if not running:
+                    break
+                
+                done = next(as_completed(running))
+                del running[done]
+                result = done.result()
+                self.results.append(result)
+                yield result
+                
+                if not self.stopped_early and pending and self.should_stop():
+                    self.stopped_early = True
+        
+        self.skipped = pending
+        self.seconds = time.time() - start
+    
+    def summary(self) -> Dict[str, object]:
+        durations = sorted(result["duration"] for result in self.results)
+        return {
+            "hosts": len(self.results) + len(self.skipped),
+            "succeeded": sum(1 for result in self.results if result["success"]),
+            "failed": sorted(result["host"] for result in self.results if not result["success"]),
+            "skipped": self.skipped,
+            "stopped_early": self.stopped_early,
+            "seconds": self.seconds,
+            "host_seconds": {
+                "median": durations[len(durations) // 2] if durations else 0.0,
+                "max": durations[-1] if durations else 0.0
+            }
+        }
+
+
+class CommandLine:
+    """non-interactive subcommands for scripted use"""
+    
+    def __init__(self, helper: AURHelper, args: argparse.Namespace):
+        self.helper = helper
+        self.args = args
+        self.manager = args.manager or helper.config.get("default_manager", "pacman")
+        self.daemon = None if args.no_daemon else DaemonClient(default_socket_path(helper.config))
+    
+    def ask_daemon(self, op: str, **params) -> Optional[dict]:
+        if self.daemon is None:
+            return None
+        return self.daemon.request(op, manager=self.manager, **params)
+    
+    def run(self) -> int:
+        if self.args.yes:
+            # never stop at a prompt; the change is not saved to the config file
+            self.helper.config.config["auto_confirm"] = True
+        self.helper.config.config["show_progress"] = False
+        
+        handler = getattr(self, f"cmd_{self.args.command}")
+        if self.args.json:
+            # prompts still happen without -y, on stderr like the rest of the progress output
+            with self.stdout_to_stderr():
+                result = self.confirmed(handler)
+            print(json.dumps(result, indent=2))
+        else:
+            result = self.confirmed(handler)
+        return 0 if result.get("success", True) else 1
+    
+    def confirmed(self, handler) -> dict:
+        """run a command, failing cleanly when it needs an answer and stdin has none"""
+        try:
+            return handler()
+        except EOFError:
+            print(f"{Colors.RED}Confirmation needed but stdin is closed; pass -y to run without prompts{Colors.END}",
+                  file=sys.stderr)
+            return {"command": self.args.command, "error": "confirmation required", "success": False}
+    
+    @staticmethod
+    @contextmanager
+    def stdout_to_stderr():
+        """keep stdout clean for JSON, including output of child processes"""
+        sys.stdout.flush()
+        saved_fd = os.dup(1)
+        try:
+            os.dup2(2, 1)
+            with redirect_stdout(sys.stderr):
+                yield
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved_fd, 1)
+            os.close(saved_fd)
+    
+    def cmd_install(self) -> dict:
+        if self.args.plan:
+            plan = self.helper.plan_install(self.args.packages, self.manager)
+            if plan is None:
+                print(f"{Colors.RED}Local and sync package databases are needed for a plan{Colors.END}")
+                return {"command": "install", "plan": None, "success": False}
+            if not self.args.json:
+                self.helper.show_install_plan(plan)
+            return {"command": "install", "plan": plan, "success": not plan["missing"]}
+        
+        found = []
+        not_found = {}
+        for package in self.args.packages:
+            if self.helper.check_package_exists(self.manager, package):
+                found.append(package)
+            else:
+                not_found[package] = self.helper.find_similar(self.manager, package)[0]
+        
+        for package, suggestions in not_found.items():
+            hint = f" (did you mean: {', '.join(suggestions[:3])}?)" if suggestions else ""
+            print(f"{Colors.RED}Package '{package}' not found{hint}{Colors.END}")
+        
+        success = not not_found and self.helper.install_package(self.manager, found)
+        return {"command": "install", "manager": self.manager, "packages": found,
+                "not_found": not_found, "success": success}
+    
+    def cmd_remove(self) -> dict:
+        if self.args.dry_run:
+            impact = self.helper.analyze_removal(self.args.packages, self.args.mode)
+            if impact is None:
+                print(f"{Colors.RED}Local package database is not readable{Colors.END}")
+                return {"command": "remove", "dry_run": True, "success": False}
+            if not self.args.json:
+                self.helper.show_removal_impact(impact)
+            return {"command": "remove", "dry_run": True, **impact,
+                    "success": not impact["blockers"] and not impact["not_found"]}
+        
+        success = self.helper.remove_package(self.manager, self.args.packages, self.args.mode)
+        return {"command": "remove", "manager": self.manager, "packages": self.args.packages,
+                "mode": self.args.mode, "success": success}
+    
+    def cmd_update(self) -> dict:
+        success = self.helper.update_system(self.manager, self.args.mode)
+        return {"command": "update", "manager": self.manager, "mode": self.args.mode, "success": success}
+    
+    def cmd_search(self) -> dict:
+        response = self.ask_daemon("search", query=self.args.query)
+        if response is not None:
+            results = response["results"]
+        else:
+            similar, packages = self.helper.find_similar(self.manager, self.args.query)
+            results = [packages[name].as_dict() for name in similar]
+        if not self.args.json:
+            for pkg in results:
+                print(f"{Colors.WHITE}{pkg.get('repo', 'unknown')}/{pkg['name']} {pkg.get('version', '')}{Colors.END}")
+                if pkg.get("description"):
+                    print(f"    {pkg['description']}")
+        return {"command": "search", "query": self.args.query, "results": results, "success": True}
+    
+    def cmd_info(self) -> dict:
+        if not self.args.packages:
+            installed = self.helper.get_installed_packages()
+            result = {
+                "command": "info",
+                "installed_packages": len(installed),
+                "managers": {manager: self.helper.is_installed(manager) for manager in self.helper.supported_managers},
+                "recent_operations": self.helper.journal.tail(5),
+                "success": True
+            }
+            if not self.args.json:
+                print(f"📦 Installed packages: {result['installed_packages']}")
+                for manager, available in result["managers"].items():
+                    print(f"  {manager}: {'✅ Installed' if available else '❌ Not installed'}")
+            return result
+        
+        response = self.ask_daemon("info", packages=self.args.packages)
+        if response is not None:
+            packages = response["packages"]
+        else:
+            local = self.helper.local_db.packages()
+            packages = {
+                package: {
+                    "installed": local.get(package),
+                    "repositories": self.helper.sync_index.find(package) if self.helper.sync_index.available() else []
+                }
+                for package in self.args.packages
+            }
+        if not self.args.json:
+            for package, info in packages.items():
+                status = f"installed {info['installed']['version']}" if info["installed"] else "not installed"
+                repos = ", ".join(f"{entry['repo']} {entry['version']}" for entry in info["repositories"]) or "-"
+                print(f"{Colors.WHITE}{package}{Colors.END}: {status}; repositories: {repos}")
+        return {"command": "info", "packages": packages,
+                "success": all(info["installed"] or info["repositories"] for info in packages.values())}
+    
+    def cmd_exists(self) -> dict:
+        response = self.ask_daemon("exists", packages=self.args.packages)
+        if response is not None:
+            exists = response["exists"]
+        else:
+            exists = {package: self.helper.check_package_exists(self.manager, package) for package in self.args.packages}
+        if not self.args.json:
+            for package, found in exists.items():
+                print(f"{package}: {'found' if found else 'not found'}")
+        return {"command": "exists", "exists": exists, "success": all(exists.values())}
+    
+    def cmd_fleet(self) -> dict:
+        config = self.helper.config
+        operation = self.args.operation
+        if operation[:1] == ["--"]:
+            operation = operation[1:]
+        try:
+            parsed = build_parser().parse_args(operation)
+        except SystemExit:
+            parsed = None
+        if parsed is None or parsed.command in (None, "fleet", "daemon"):
+            print(f"{Colors.RED}Give the operation to run on every host, e.g. fleet -- update --mode full{Colors.END}")
+            return {"command": "fleet", "success": False}
+        
+        if self.args.hosts:
+            hosts = [host for host in self.args.hosts.split(",") if host]
+        else:
+            try:
+                hosts = load_inventory(self.args.inventory or config.get("fleet_inventory"))
+            except OSError as e:
+                print(f"{Colors.RED}Cannot read host inventory: {e}{Colors.END}")
+                return {"command": "fleet", "success": False}
+        if not hosts:
+            print(f"{Colors.YELLOW}No hosts to run on.{Colors.END}")
+            return {"command": "fleet", "hosts": 0, "success": False}
+        
+        if self.args.local:
+            executor = LocalExecutor(config.get("fleet_timeout", 3600))
+        else:
+            executor = SSHExecutor(config.get("fleet_remote_command", "aur-helper"),
+                                   config.get("fleet_ssh_options"), config.get("fleet_timeout", 3600))
+        if not executor.supports(parsed):
+            print(f"{Colors.RED}--local only runs operations that change nothing "
+                  f"(search, info, exists, backup, orphans, install --plan, remove/clean --dry-run){Colors.END}")
+            return {"command": "fleet", "success": False}
+        
+        runner = FleetRunner(
+            executor,
+            self.args.jobs or config.get("fleet_jobs", 10),
+            self.args.max_failure_rate if self.args.max_failure_rate is not None
+            else config.get("fleet_max_failure_rate", 0.25)
+        )
+        
+        # remote runs never prompt and always report JSON
+        argv = ["--json", "-y"] + (["-m", self.args.manager] if self.args.manager else []) + operation
+        print(f"{Colors.BLUE}🚀 Running '{' '.join(operation)}' on {len(hosts)} hosts "
+              f"({runner.jobs} at a time)...{Colors.END}")
+        for number, result in enumerate(runner.run(hosts, argv), 1):
+            mark = f"{Colors.GREEN}✓" if result["success"] else f"{Colors.RED}✗"
+            error = f" {result['error']}" if result["error"] else ""
+            print(f"  [{number}/{len(hosts)}] {mark} {result['host']}{Colors.END} ({result['duration']:.1f}s){error}")
+            self.helper.logger.info(f"Fleet host finished: {result['host']}", host=result["host"],
+                                    success=result["success"], duration=result["duration"])
+        
+        summary = runner.summary()
+        if runner.stopped_early:
+            print(f"{Colors.RED}❌ Failure rate above {runner.max_failure_rate:.0%}, "
+                  f"skipped {len(summary['skipped'])} hosts.{Colors.END}")
+        print(f"{Colors.CYAN}{summary['succeeded']}/{summary['hosts']} hosts succeeded in "
+              f"{summary['seconds']:.1f}s (median {summary['host_seconds']['median']:.1f}s, "
+              f"slowest {summary['host_seconds']['max']:.1f}s){Colors.END}")
+        if summary["failed"]:
+            print(f"{Colors.RED}Failed: {', '.join(summary['failed'])}{Colors.END}")
+        
+        return {"command": "fleet", "operation": operation, **summary, "results": runner.results,
+                "success": not summary["failed"] and not summary["skipped"]}
+    
+    def cmd_backup(self) -> dict:
+        backups = self.helper.backups
+        if self.args.action == "list":
+            snapshots = backups.list()
+            if not self.args.json:
+                for snap in snapshots:
+                    stamp = datetime.fromtimestamp(snap["timestamp"]).isoformat(sep=" ", timespec="seconds")
+                    print(f"{snap['digest'][:12]}  {stamp}")
+            return {"command": "backup", "snapshots": snapshots, "success": True}
+        
+        if self.args.snapshot:
+            digest = backups.resolve(self.args.snapshot)
+        else:
+            # the state before the most recent journaled operation
+            digest = next((op["backup"] for op in reversed(self.helper.journal.tail(20))
+                           if op.get("backup") and backups.resolve(op["backup"])), None)
+        if self.args.snapshot and digest is None:
+            print(f"{Colors.RED}No single snapshot matches '{self.args.snapshot}'{Colors.END}")
+            return {"command": "backup", "success": False}
+        packages = backups.restore(digest)
+        if packages is None:
+            print(f"{Colors.RED}No backup snapshot available{Colors.END}")
+            return {"command": "backup", "success": False}
+        if not self.args.json:
+            # one name per line, ready for `pacman -S --needed -`
+            for package in packages:
+                print(package)
+        return {"command": "backup", "snapshot": digest, "packages": packages, "success": True}
+    
+    def cmd_daemon(self) -> dict:
+        PackageDaemon(self.helper, default_socket_path(self.helper.config),
+                      self.helper.config.get("daemon_poll_interval", 1.0)).serve()
+        return {"command": "daemon", "success": True}
+    
+    def cmd_orphans(self) -> dict:
+        if self.args.remove:
+            success = self.helper.remove_orphaned_packages()
+            return {"command": "orphans", "removed": success, "success": success}
+        
+        orphans = self.helper.find_orphans()
+        if orphans is None:
+            return {"command": "orphans", "orphans": [], "success": False}
+        if not self.args.json:
+            for pkg in orphans:
+                print(pkg)
+        return {"command": "orphans", "orphans": orphans, "success": True}
+    
+    def cmd_clean(self) -> dict:
+        report = self.helper.clean_package_cache(self.args.dry_run)
+        if not self.args.json:
+            for name in report["removed"]:
+                print(name)
+            verb = "Would reclaim" if self.args.dry_run else "Reclaimed"
+            print(f"{verb} {format_size(report['freed'])} from {len(report['removed'])} files, "
+                  f"{report['kept']} files ({format_size(report['kept_size'])}) kept")
+        return {"command": "clean", **report, "success": True}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="aur-helper",
+        description="Interactive package manager interface for Arch Linux. "
+                    "Run without a command for the interactive menu."
+    )
+    parser.add_argument("--profile", action="store_true", help="print a per-phase timing breakdown at exit")
+    parser.add_argument("--profile-dump", metavar="FILE", help="write cProfile statistics to FILE")
+    parser.add_argument("--profile-export", metavar="FILE", help="write timing spans as JSON to FILE")
+    parser.add_argument("-m", "--manager", choices=["pacman", "yay", "paru"], help="package manager (default: from config)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON (prompts go to stderr)")
+    parser.add_argument("-y", "--yes", action="store_true", help="don't ask for confirmation")
+    parser.add_argument("--no-daemon", action="store_true", help="don't route queries through a running daemon")
+    
+    # the same options are accepted after the command; SUPPRESS keeps a subcommand
+    # from resetting a value that was given before it
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-m", "--manager", choices=["pacman", "yay", "paru"], default=argparse.SUPPRESS,
+                        help="package manager (default: from config)")
+    common.add_argument("--json", action="store_true", default=argparse.SUPPRESS,
+                        help="print machine-readable JSON (prompts go to stderr)")
+    common.add_argument("-y", "--yes", action="store_true", default=argparse.SUPPRESS, help="don't ask for confirmation")
+    common.add_argument("--no-daemon", action="store_true", default=argparse.SUPPRESS,
+                        help="don't route queries through a running daemon")
+    
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    
+    install = commands.add_parser("install", parents=[common], help="install packages")
+    install.add_argument("packages", nargs="+")
+    install.add_argument("--plan", action="store_true", help="only show the dependency closure and sizes")
+    
+    remove = commands.add_parser("remove", parents=[common], help="remove packages")
+    remove.add_argument("packages", nargs="+")
+    remove.add_argument("--mode", choices=["simple", "full", "purge"], default="simple")
+    remove.add_argument("--dry-run", action="store_true", help="only show what would be removed or broken")
+    
+    update = commands.add_parser("update", parents=[common], help="update the system")
+    update.add_argument("--mode", choices=["standard", "full", "refresh", "force"], default="standard")
+    
+    search = commands.add_parser("search", parents=[common], help="fuzzy search for packages")
+    search.add_argument("query")
+    
+    info = commands.add_parser("info", parents=[common], help="system information, or details of the given packages")
+    info.add_argument("packages", nargs="*")
+    
+    exists = commands.add_parser("exists", parents=[common], help="check that packages can be installed (exit code 1 if any can't)")
+    exists.add_argument("packages", nargs="+")
+    
+    commands.add_parser("daemon", parents=[common], help="keep package indexes warm and serve queries over a Unix socket")
+    
+    orphans = commands.add_parser("orphans", parents=[common], help="list orphaned packages")
+    orphans.add_argument("--remove", action="store_true", help="remove them")
+    
+    fleet = commands.add_parser("fleet", parents=[common], help="run a command on every host of an inventory over ssh")
+    fleet.add_argument("-i", "--inventory", help="file with one host per line (default: from config)")
+    fleet.add_argument("--hosts", help="comma separated hosts instead of an inventory")
+    fleet.add_argument("-j", "--jobs", type=int, help="hosts to run at once")
+    fleet.add_argument("--max-failure-rate", type=float, help="stop starting hosts above this failure rate (0-1)")
+    fleet.add_argument("--local", action="store_true",
+                       help="run locally once per host instead of over ssh (read-only operations only)")
+    fleet.add_argument("operation", nargs=argparse.REMAINDER, help="the command to run, after --")
+    
+    backup = commands.add_parser("backup", parents=[common], help="list package state snapshots or print one's package list")
+    backup.add_argument("action", choices=["list", "show"])
+    backup.add_argument("snapshot", nargs="?",
+                        help="digest or digest prefix (default: the one taken before the last operation)")
+    
+    clean = commands.add_parser("clean", parents=[common], help="prune old package versions from the pacman cache")
+    clean.add_argument("--dry-run", action="store_true", help="only report what would be removed")
+    
+    return parser
+
+
 def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    exit_code = 0
+    
     try:
         helper = AURHelper()
-        helper.run()
+        helper.profiler.enabled = args.profile or bool(args.profile_export)
+        profile = cProfile.Profile() if args.profile_dump else None
+        if profile:
+            profile.enable()
+        try:
+            if args.command:
+                exit_code = CommandLine(helper, args).run()
+            else:
+                helper.run()
+        finally:
+            if profile:
+                profile.disable()
+                profile.dump_stats(args.profile_dump)
+            if args.profile:
+                helper.profiler.report()
+            if args.profile_export:
+                helper.profiler.export(args.profile_export)
     except Exception as e:
         print(f"Failed to start AUR Helper: {e}")
         sys.exit(1)
+    
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
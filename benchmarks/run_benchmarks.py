@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+# Benchmarks for the AUR Helper hot paths
+# Copyright (C) 2025 kirey-arch
+# Licensed under the GNU GPL v3. See LICENSE for more information
+#
+# Runs against stub pacman/yay/paru executables and synthetic local, sync
+# and AUR databases, so it works on any Linux box:
+#
+#     python3 benchmarks/run_benchmarks.py --sizes 1000,10000,200000
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_HISTORY = Path(__file__).resolve().parent / "results.jsonl"
+
+WORDS = [
+    "lib", "python", "perl", "ruby", "node", "rust", "go", "haskell", "qt5", "qt6",
+    "gtk", "gnome", "kde", "xfce", "font", "theme", "icon", "git", "bin", "cli",
+    "google", "chrome", "firefox", "vim", "emacs", "audio", "video", "x11", "wayland", "docs"
+]
+
+STUB = r'''#!/usr/bin/env python3
+import os, re, sys
+data = os.environ["AUR_HELPER_BENCH_DATA"]
+manager = os.path.basename(sys.argv[0])
+args = sys.argv[1:]
+
+def rows(name):
+    with open(os.path.join(data, name)) as f:
+        for line in f:
+            yield line.rstrip("\n").split("\t")
+
+if not args:
+    sys.exit(1)
+if args[0] == "--version":
+    print(f"{manager} v1.0.0 - libalpm v14.0.0 (benchmark stub)")
+elif args[0] == "-Qq":
+    for (name,) in rows("local.tsv"):
+        print(name)
+elif args[0] in ("-Qtdq", "-Qmq"):
+    sys.exit(1)
+elif args[0] == "-Ss":
+    pattern = re.compile(" ".join(args[1:]) or ".", re.IGNORECASE)
+    sources = ["repo.tsv"] + (["aur.tsv"] if manager != "pacman" else [])
+    found = False
+    for source in sources:
+        for repo, name, version, desc in rows(source):
+            if pattern.search(name) or pattern.search(desc):
+                print(f"{repo}/{name} {version}")
+                print(f"    {desc}")
+                found = True
+    sys.exit(0 if found else 1)
+else:
+    sys.exit(0)
+'''
+
+
+def load_helper_module():
+    spec = importlib.util.spec_from_file_location("aur_helper", ROOT / "aur-helper.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_names(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        parts = rng.sample(WORDS, rng.randint(1, 3))
+        suffix = "".join(rng.choices("abcdefghijklmnopqrstuvwxyz0123456789", k=rng.randint(0, 4)))
+        names.add("-".join(parts) + (f"-{suffix}" if suffix else ""))
+    return sorted(names)
+
+
+def desc_entry(fields: dict) -> str:
+    text = ""
+    for key, value in fields.items():
+        values = value if isinstance(value, list) else [value]
+        if values:
+            text += f"%{key}%\n" + "\n".join(str(v) for v in values) + "\n\n"
+    return text
+
+
+def build_environment(workdir: Path, size: int) -> dict:
+    """stub executables plus local/sync/AUR databases with `size` packages each"""
+    rng = random.Random(size)
+    data_dir = workdir / "data"
+    bin_dir = workdir / "bin"
+    db_path = workdir / "pacman"
+    home = workdir / "home"
+    for path in (data_dir, bin_dir, db_path / "local", db_path / "sync", home / ".config" / "aur-helper"):
+        path.mkdir(parents=True, exist_ok=True)
+
+    repo_names = synthetic_names(size, seed=size)
+    aur_names = [f"{name}-git" for name in synthetic_names(size, seed=size + 1)]
+    local_names = sorted(rng.sample(repo_names, max(1, size // 2)))
+
+    repos = ["core", "extra", "multilib"]
+    repo_of = {name: repos[i % len(repos)] for i, name in enumerate(repo_names)}
+
+    with open(data_dir / "repo.tsv", "w") as f:
+        for name in repo_names:
+            f.write(f"{repo_of[name]}\t{name}\t1.{len(name)}-1\tSynthetic package {name}\n")
+    with open(data_dir / "aur.tsv", "w") as f:
+        for name in aur_names:
+            f.write(f"aur\t{name}\tr{len(name)}.g1234-1\tSynthetic AUR package {name}\n")
+    with open(data_dir / "local.tsv", "w") as f:
+        f.write("\n".join(local_names) + "\n")
+
+    for repo in repos:
+        with tarfile.open(db_path / "sync" / f"{repo}.db", "w:gz") as tar:
+            for name in repo_names:
+                if repo_of[name] != repo:
+                    continue
+                data = desc_entry({
+                    "FILENAME": f"{name}-1.{len(name)}-1-x86_64.pkg.tar.zst",
+                    "NAME": name,
+                    "VERSION": f"1.{len(name)}-1",
+                    "DESC": f"Synthetic package {name}",
+                    "CSIZE": 1000 * len(name),
+                    "ISIZE": 4000 * len(name),
+                    "PROVIDES": [f"{name}-virtual"] if len(name) % 7 == 0 else []
+                }).encode()
+                info = tarfile.TarInfo(f"{name}-1.{len(name)}-1/desc")
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+    for name in local_names:
+        pkg_dir = db_path / "local" / f"{name}-1.{len(name)}-1"
+        pkg_dir.mkdir(exist_ok=True)
+        (pkg_dir / "desc").write_text(desc_entry({
+            "NAME": name,
+            "VERSION": f"1.{len(name)}-1",
+            "DESC": f"Synthetic package {name}",
+            "SIZE": 4000 * len(name),
+            "REASON": len(name) % 2
+        }))
+
+    for manager in ("pacman", "yay", "paru"):
+        stub = bin_dir / manager
+        stub.write_text(STUB.replace("#!/usr/bin/env python3", f"#!{sys.executable}", 1))
+        stub.chmod(0o755)
+
+    (home / ".config" / "aur-helper" / "config.json").write_text(json.dumps({
+        "pacman_db_path": str(db_path),
+        "show_progress": False,
+        "backup_before_operations": True,
+        "use_aur_rpc": False
+    }))
+
+    return {
+        "home": str(home),
+        "path": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        "data": str(data_dir),
+        "repo_names": repo_names,
+        "aur_names": aur_names,
+        "local_names": local_names
+    }
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(func, iterations: int) -> dict:
+    func()  # warm up caches the way a second call in one session would
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {
+        "iterations": iterations,
+        "p50": percentile(samples, 0.50),
+        "p95": percentile(samples, 0.95),
+        "p99": percentile(samples, 0.99),
+        "ops_per_sec": iterations / sum(samples) if sum(samples) else 0.0
+    }
+
+
+def run_size(module, size: int, iterations: int, quiet: bool) -> list:
+    workdir = Path(tempfile.mkdtemp(prefix=f"aur-helper-bench-{size}-"))
+    try:
+        start = time.perf_counter()
+        env = build_environment(workdir, size)
+        setup = time.perf_counter() - start
+        print(f"Synthetic databases with {size} packages ready in {setup:.1f}s")
+
+        os.environ["HOME"] = env["home"]
+        os.environ["PATH"] = env["path"]
+        os.environ["AUR_HELPER_BENCH_DATA"] = env["data"]
+
+        helper = module.AURHelper()
+        rng = random.Random(0)
+        present = rng.sample(env["repo_names"], min(50, len(env["repo_names"])))
+        typos = [name[:-2] if len(name) > 4 else name for name in present]
+        aur_targets = rng.sample(env["aur_names"], min(5, len(env["aur_names"])))
+
+        def cycle(items):
+            state = {"i": 0}
+
+            def take():
+                state["i"] += 1
+                return items[state["i"] % len(items)]
+            return take
+
+        next_present = cycle(present)
+        next_typo = cycle(typos)
+        next_aur = cycle(aur_targets)
+        devnull = open(os.devnull, "w")
+
+        def quiet_call(func, *args):
+            stdout = sys.stdout
+            sys.stdout = devnull
+            try:
+                return func(*args)
+            finally:
+                sys.stdout = stdout
+
+        def cold_installed():
+            helper.local_db._mtime = None
+            return helper.get_installed_packages()
+
+        def cold_matcher():
+            helper._repo_matcher = None
+            return helper.get_repo_matcher()
+
+        cases = [
+            ("get_installed_packages (cached)", helper.get_installed_packages, iterations),
+            ("get_installed_packages (cold)", cold_installed, max(3, iterations // 10)),
+            ("backup_system_state", helper.backup_system_state, max(3, iterations // 10)),
+            ("check_package_exists (index)", lambda: quiet_call(helper.check_package_exists, "pacman", next_present()), iterations),
+            ("check_package_exists (aur -Ss)", lambda: quiet_call(helper.check_package_exists, "yay", next_aur()), max(3, iterations // 10)),
+            ("search_packages (-Ss)", lambda: helper.search_packages("pacman", next_typo()), max(3, iterations // 10)),
+            ("fuzzy matcher build", cold_matcher, max(3, iterations // 10)),
+            ("fuzzy match (full corpus)", lambda: helper.get_repo_matcher().scored(
+                next_typo(), helper.config.get("max_search_results", 10), helper.config.get("search_cutoff", 0.3)
+            ), iterations)
+        ]
+
+        results = []
+        for name, func, count in cases:
+            stats = measure(func, count)
+            results.append({"benchmark": name, "size": size, **stats})
+            if not quiet:
+                print(f"  {name:<34} p50 {stats['p50'] * 1000:9.2f}ms  ops/s {stats['ops_per_sec']:10.1f}")
+        devnull.close()
+        helper.logger.flush()
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def load_history(path: Path) -> dict:
+    """latest previous result per (benchmark, size)"""
+    previous = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                run = json.loads(line)
+                for result in run.get("results", []):
+                    previous[(result["benchmark"], result["size"])] = result
+    except (OSError, ValueError):
+        pass
+    return previous
+
+
+def report(results: list, previous: dict):
+    print(f"\n{'Benchmark':<34} {'Size':>7} {'p50':>10} {'p95':>10} {'p99':>10} {'ops/s':>10} {'Δp50':>8}")
+    print("-" * 95)
+    for result in results:
+        before = previous.get((result["benchmark"], result["size"]))
+        delta = ""
+        if before and before["p50"]:
+            delta = f"{(result['p50'] - before['p50']) / before['p50'] * 100:+.0f}%"
+        print(f"{result['benchmark']:<34} {result['size']:>7} {result['p50'] * 1000:>8.2f}ms "
+              f"{result['p95'] * 1000:>8.2f}ms {result['p99'] * 1000:>8.2f}ms "
+              f"{result['ops_per_sec']:>10.1f} {delta:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AUR Helper hot paths against synthetic databases")
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated package counts (default: 1000,10000)")
+    parser.add_argument("--iterations", type=int, default=50, help="samples per fast benchmark (default: 50)")
+    parser.add_argument("--history", default=str(DEFAULT_HISTORY), help="JSON lines file results are appended to")
+    parser.add_argument("--no-history", action="store_true", help="don't record this run")
+    parser.add_argument("--quiet", action="store_true", help="only print the final table")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    saved_env = {key: os.environ.get(key) for key in ("HOME", "PATH", "AUR_HELPER_BENCH_DATA")}
+    module = load_helper_module()
+
+    results = []
+    try:
+        for size in sizes:
+            results.extend(run_size(module, size, args.iterations, args.quiet))
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    history = Path(args.history)
+    report(results, load_history(history))
+
+    if not args.no_history:
+        with open(history, "a") as f:
+            f.write(json.dumps({
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "python": sys.version.split()[0],
+                "results": results
+            }) + "\n")
+        print(f"\nResults appended to {history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,651 @@
+#!/usr/bin/env python3
+
+# Tests for the AUR Helper's in-process package logic
+# Copyright (C) 2025 kirey-arch
+# Licensed under the GNU GPL v3. See LICENSE for more information
+#
+# Everything runs against synthetic pacman databases in a temporary directory:
+#
+#     python3 -m pytest -q tests
+
+import http.server
+import importlib.util
+import io
+import json
+import os
+import tarfile
+import threading
+import urllib.parse
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_helper_module():
+    spec = importlib.util.spec_from_file_location("aur_helper", ROOT / "aur-helper.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+aur_helper = load_helper_module()
+
+
+# (a, b, expected), mostly from pacman's own vercmp tests; each pair is also checked reversed
+VERCMP_CASES = [
+    # plain versions
+    ("1.5.0", "1.5.0", 0),
+    ("1.5.1", "1.5.0", 1),
+    ("1.5.1", "1.5", 1),
+    # pkgrel
+    ("1.5.0-1", "1.5.0-1", 0),
+    ("1.5.0-1", "1.5.0-2", -1),
+    ("1.5.0-2", "1.5.1-1", -1),
+    ("1.5-2", "1.5.1-1", -1),
+    # pkgrel only counts when both sides have one
+    ("1.5", "1.5-1", 0),
+    ("1.1-1", "1.1", 0),
+    ("1.0-1", "1.1", -1),
+    # alpha vs numeric
+    ("1.5b", "1.5", -1),
+    ("1.5b-1", "1.5", -1),
+    ("1.5b", "1.5.1", -1),
+    ("1.0a", "1.0alpha", -1),
+    ("1.0alpha", "1.0b", -1),
+    ("1.0beta", "1.0rc", -1),
+    ("1.0rc", "1.0", -1),
+    ("1.5.a", "1.5", 1),
+    ("1.5.1", "1.5.b", 1),
+    ("1.5-1", "1.5.b", -1),
+    # separators
+    ("2.0", "2_0", 0),
+    ("2.0_a", "2_0.a", 0),
+    ("2.0a", "2.0.a", -1),
+    ("2___a", "2_a", 1),
+    ("1.0", "1.0.", -1),
+    ("1.0.", "1.0..", 0),
+    # leading zeros
+    ("1.01", "1.1", 0),
+    ("1.010", "1.9", 1),
+    # epochs
+    ("0:1.0", "1.0", 0),
+    ("1:1.0", "2.0", 1),
+    ("1:1.0", "0:1.1", 1),
+    ("1:1.0", "2:1.1", -1),
+    ("1:1.0-1", "0:1.1-1", 1),
+    ("1:1.0", "0:1.0-1", 1),
+]
+
+
+@pytest.mark.parametrize("a,b,expected", VERCMP_CASES)
+def test_vercmp(a, b, expected):
+    assert aur_helper.vercmp(a, b) == expected
+    assert aur_helper.vercmp(b, a) == -expected
+
+
+@pytest.mark.parametrize("installed,op,required,expected", [
+    ("1.2-1", None, None, True),
+    ("1.2-1", ">=", "1.2", True),
+    ("1.2-1", ">", "1.2", False),
+    ("1.2-1", "<", "1.10", True),
+    ("1:0.9-1", ">=", "1.0", True),
+    ("2:6.0-1", ">=", "2:7.0", False),
+    ("2:7.0-1", ">=", "2:7.0", True),
+    ("1:9.0-1", "<", "2:1.0", True),
+    ("2:7.0-1", "=", "2:7.0-1", True),
+])
+def test_version_satisfies(installed, op, required, expected):
+    assert aur_helper.version_satisfies(installed, op, required) is expected
+
+
+@pytest.mark.parametrize("dep,expected", [
+    ("glibc", ("glibc", None, None)),
+    ("openssl>=3", ("openssl", ">=", "3")),
+    ("ffmpeg>=2:7.0", ("ffmpeg", ">=", "2:7.0")),
+    ("libjpeg=8.3-1", ("libjpeg", "=", "8.3-1")),
+    ("python<3.13", ("python", "<", "3.13")),
+])
+def test_parse_dep(dep, expected):
+    assert aur_helper.parse_dep(dep) == expected
+
+
+@pytest.mark.parametrize("cmd,expected", [
+    ("pacman -Qmq", True),
+    ("pacman --query --quiet", True),
+    ("yay -Ss '^foo$'", True),
+    ("paru --sync --search foo", True),
+    ("pacman -Si glibc", True),
+    ("pacman --sync --info glibc", True),
+    ("pacman -Sp --print-format %n glibc", True),
+    ("pacman -T 'glibc>=2'", True),
+    ("pacman -Fl glibc", True),
+    ("yay --version", True),
+    ("expac -Q %n", True),
+    ("pacman-key --list-keys", True),
+    ("pacman -R foo", False),
+    ("pacman --remove foo", False),
+    ("pacman -S foo", False),
+    ("pacman --sync foo", False),
+    ("pacman -Syu", False),
+    ("pacman --sync --refresh --sysupgrade", False),
+    ("pacman -Sy --search foo", False),
+    ("pacman --sync --refresh --search foo", False),
+    ("pacman -Sc", False),
+    ("pacman -Sw foo", False),
+    ("pacman -U x.pkg.tar.zst", False),
+    ("pacman --upgrade x.pkg.tar.zst", False),
+    ("pacman -D --asdeps foo", False),
+    ("pacman --database --asdeps foo", False),
+    ("pacman -Fy", False),
+    ("pacman --files --refresh", False),
+    ("yay", False),
+    ("yay -Yc", False),
+    ("pacman-key --populate", False),
+    ("sudo pacman -Q", False),
+    ("makepkg -si", False),
+    ("rm -rf /tmp/x", False),
+    ("", False),
+])
+def test_is_read_only(cmd, expected):
+    assert aur_helper.AsyncQueryRunner.is_read_only(cmd) is expected
+
+
+def write_local(db_path, name, version, reason=0, depends=(), provides=(), optdepends=(), size=1000):
+    desc = Path(db_path, "local", f"{name}-{version}", "desc")
+    desc.parent.mkdir(parents=True, exist_ok=True)
+    text = f"%NAME%\n{name}\n\n%VERSION%\n{version}\n\n%SIZE%\n{size}\n\n%REASON%\n{reason}\n\n"
+    for field, values in (("DEPENDS", depends), ("PROVIDES", provides), ("OPTDEPENDS", optdepends)):
+        if values:
+            text += f"%{field}%\n" + "\n".join(values) + "\n\n"
+    desc.write_text(text)
+
+
+def write_sync(db_path, repo, packages):
+    sync_dir = Path(db_path, "sync")
+    sync_dir.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(sync_dir / f"{repo}.db", "w:gz") as tar:
+        for pkg in packages:
+            version = pkg.get("version", "1.0-1")
+            text = (f"%FILENAME%\n{pkg['name']}-{version}-x86_64.pkg.tar.zst\n\n%NAME%\n{pkg['name']}\n\n"
+                    f"%VERSION%\n{version}\n\n%CSIZE%\n100\n\n%ISIZE%\n400\n\n")
+            for field in ("depends", "provides", "groups"):
+                if pkg.get(field):
+                    text += f"%{field.upper()}%\n" + "\n".join(pkg[field]) + "\n\n"
+            data = text.encode()
+            info = tarfile.TarInfo(f"{pkg['name']}-{version}/desc")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+class TestBackupStore:
+    def test_round_trip(self, tmp_path):
+        store = aur_helper.BackupStore(str(tmp_path))
+        first = store.save({"bash", "glibc", "zsh"})
+        assert store.restore() == ["bash", "glibc", "zsh"]
+        assert store.restore(first) == ["bash", "glibc", "zsh"]
+
+    def test_digest_survives_later_snapshots(self, tmp_path):
+        store = aur_helper.BackupStore(str(tmp_path))
+        first = store.save({"bash", "glibc", "zsh"})
+        second = store.save({"bash", "glibc", "fish"})
+        assert first != second
+        # the older snapshot is now stored as a delta and replayed from its parent
+        assert store.restore(first) == ["bash", "glibc", "zsh"]
+        assert store.restore(second) == ["bash", "fish", "glibc"]
+        assert [snap["digest"] for snap in store.list()] == [first, second]
+
+    def test_unchanged_state_reuses_snapshot(self, tmp_path):
+        store = aur_helper.BackupStore(str(tmp_path))
+        assert store.save({"bash"}) == store.save({"bash"})
+        assert len(store.list()) == 1
+
+    def test_resolve_prefix(self, tmp_path):
+        store = aur_helper.BackupStore(str(tmp_path))
+        digest = store.save({"bash"})
+        assert store.resolve(digest[:8]) == digest
+        assert store.resolve("not-a-digest") is None
+        assert store.resolve("") is None
+
+
+class TestDependencyGraphRemoval:
+    @pytest.fixture
+    def graph(self, tmp_path):
+        write_local(tmp_path, "app", "1.0-1", depends=["libfoo", "sh"], size=100)
+        write_local(tmp_path, "libfoo", "1.0-1", reason=1, depends=["libbar"], size=10)
+        write_local(tmp_path, "libbar", "1.0-1", reason=1, size=1)
+        write_local(tmp_path, "bash", "5.2-1", provides=["sh"], size=1000)
+        write_local(tmp_path, "dash", "0.5-1", provides=["sh"])
+        write_local(tmp_path, "viewer", "1.0-1", optdepends=["libfoo: previews"])
+        return aur_helper.LocalDatabase(str(tmp_path)).graph()
+
+    def test_plain_removal(self, graph):
+        result = graph.removal(["app"], recursive=False)
+        assert result["remove"] == ["app"]
+        assert result["freed"] == 100
+        assert result["blockers"] == {}
+        assert result["not_found"] == []
+
+    def test_recursive_removal_takes_unneeded_dependencies(self, graph):
+        result = graph.removal(["app"], recursive=True)
+        assert result["remove"] == ["app", "libbar", "libfoo"]
+        assert result["freed"] == 111
+        assert result["optional"] == {"libfoo": ["viewer"]}
+
+    def test_blockers(self, graph):
+        assert graph.removal(["libfoo"], recursive=False)["blockers"] == {"libfoo": ["app"]}
+
+    def test_remaining_provider_is_not_a_blocker(self, graph):
+        assert graph.removal(["bash"], recursive=False)["blockers"] == {}
+        assert graph.removal(["bash", "dash"], recursive=False)["blockers"] == {"bash": ["app"], "dash": ["app"]}
+
+    def test_not_installed_target(self, graph):
+        result = graph.removal(["app", "missing"], recursive=True)
+        assert result["not_found"] == ["missing"]
+        assert result["remove"] == []
+
+
+class FakeAUR:
+    def __init__(self, packages):
+        self.packages = packages
+
+    def info(self, names, offline=False):
+        return {name: self.packages[name] for name in names if name in self.packages}
+
+
+class TestUpgradePlanner:
+    @pytest.fixture
+    def planner(self, tmp_path):
+        def make(options="", aur=None):
+            write_local(tmp_path, "glibc", "2.39-1")
+            write_local(tmp_path, "plasma-desktop", "6.0-1")
+            write_local(tmp_path, "kwin", "6.0-1")
+            write_local(tmp_path, "vim", "9.1-2")
+            write_local(tmp_path, "foo-git", "r1-1")
+            write_local(tmp_path, "bar-bin", "1.0-1")
+            write_sync(tmp_path, "core", [{"name": "glibc", "version": "2.40-1"}])
+            write_sync(tmp_path, "extra", [
+                {"name": "plasma-desktop", "version": "6.1-1", "groups": ["plasma"]},
+                {"name": "kwin", "version": "6.1-1", "groups": ["plasma"]},
+                {"name": "vim", "version": "9.1-1"},
+            ])
+            write_sync(tmp_path, "testing", [{"name": "glibc", "version": "2.41-1"}])
+            conf = tmp_path / "pacman.conf"
+            conf.write_text(f"[options]\n{options}\n[core]\n[extra]\n")
+            return aur_helper.UpgradePlanner(
+                aur_helper.LocalDatabase(str(tmp_path)),
+                aur_helper.SyncIndex(str(tmp_path), str(tmp_path / "sync_index.json")),
+                aur_helper.PacmanConf(str(conf)),
+                aur
+            )
+        return make
+
+    def test_repo_upgrades(self, planner):
+        plan = planner().plan()
+        # glibc comes from core, the first repository in pacman.conf; the local vim is newer
+        assert [(u["name"], u["old"], u["new"], u["repo"]) for u in plan["upgrades"]] == [
+            ("glibc", "2.39-1", "2.40-1", "core"),
+            ("kwin", "6.0-1", "6.1-1", "extra"),
+            ("plasma-desktop", "6.0-1", "6.1-1", "extra"),
+        ]
+        assert plan["download_size"] == 300
+        assert plan["size_change"] == 3 * (400 - 1000)
+
+    def test_ignore_pkg(self, planner):
+        plan = planner("IgnorePkg = glibc kwin").plan()
+        assert [u["name"] for u in plan["upgrades"]] == ["plasma-desktop"]
+
+    def test_ignore_group(self, planner):
+        plan = planner("IgnoreGroup = plasma").plan()
+        assert [u["name"] for u in plan["upgrades"]] == ["glibc"]
+
+    def test_nothing_to_do(self, planner):
+        assert planner("IgnorePkg = glibc\nIgnoreGroup = plasma").plan()["upgrades"] == []
+
+    def test_aur_upgrades(self, planner):
+        aur = FakeAUR({"foo-git": {"Name": "foo-git", "Version": "r2-1"}})
+        plan = planner(aur=aur).plan(include_aur=True)
+        assert [(u["name"], u["repo"]) for u in plan["upgrades"]][-1] == ("foo-git", "aur")
+        # bar-bin is not in the cached AUR metadata
+        assert plan["aur_complete"] is False
+
+    def test_aur_is_skipped_unless_asked(self, planner):
+        aur = FakeAUR({"foo-git": {"Name": "foo-git", "Version": "r2-1"}})
+        plan = planner(aur=aur).plan()
+        assert "aur" not in [u["repo"] for u in plan["upgrades"]]
+        assert plan["aur_complete"] is True
+
+
+class TestInstallPlanner:
+    @pytest.fixture
+    def planner(self, tmp_path):
+        def make(aur=None):
+            write_local(tmp_path, "glibc", "2.40-1")
+            write_local(tmp_path, "libjpeg-turbo", "3.0-1", provides=["libjpeg=8.3", "libjpeg-compat"])
+            write_local(tmp_path, "ffmpeg", "2:6.0-1")
+            write_sync(tmp_path, "core", [
+                {"name": "glibc", "version": "2.40-1"},
+                {"name": "openssl", "version": "3.3-1"},
+            ])
+            write_sync(tmp_path, "extra", [
+                {"name": "curl", "version": "8.9-1", "depends": ["openssl>=3", "glibc"]},
+                {"name": "compat-new", "version": "2.0-1", "provides": ["libjpeg-compat=2.0"]},
+                {"name": "image-tool", "version": "1.0-1", "depends": ["libjpeg>=8", "libjpeg-compat>=2"]},
+                {"name": "ffmpeg", "version": "2:7.0-1"},
+                {"name": "player", "version": "1.0-1", "depends": ["ffmpeg>=2:7.0"]},
+                {"name": "old-player", "version": "1.0-1", "depends": ["ffmpeg>=2:6.0"]},
+            ])
+            return aur_helper.InstallPlanner(
+                aur_helper.LocalDatabase(str(tmp_path)),
+                aur_helper.SyncIndex(str(tmp_path), str(tmp_path / "sync_index.json")),
+                aur_helper.PacmanConf(str(tmp_path / "pacman.conf")),
+                aur
+            )
+        return make
+
+    def test_repo_closure(self, planner):
+        plan = planner().plan(["curl"])
+        assert [(pkg["name"], pkg["dependency"]) for pkg in plan["packages"]] == [("curl", False), ("openssl", True)]
+        assert plan["missing"] == []
+        assert plan["download_size"] == 200
+
+    def test_unversioned_provide_does_not_satisfy_versioned_dependency(self, planner):
+        plan = planner().plan(["image-tool"])
+        names = [pkg["name"] for pkg in plan["packages"]]
+        # libjpeg=8.3 satisfies libjpeg>=8, the unversioned libjpeg-compat does not satisfy >=2
+        assert names == ["compat-new", "image-tool"]
+
+    def test_epoch_constraints(self, planner):
+        plan = planner().plan(["player", "old-player"])
+        # the installed 2:6.0 only satisfies old-player, player pulls in the 2:7.0 upgrade
+        assert [pkg["name"] for pkg in plan["packages"]] == ["ffmpeg", "old-player", "player"]
+
+    def test_aur_packages_and_build_order(self, planner):
+        aur = FakeAUR({
+            "foo-git": {"Name": "foo-git", "Version": "r1-1", "PackageBase": "foo-git", "Depends": ["libfoo", "curl"]},
+            "libfoo": {"Name": "libfoo", "Version": "1.0-1", "PackageBase": "libfoo"},
+        })
+        plan = planner(aur).plan(["foo-git"])
+        assert plan["build_order"] == [["libfoo"], ["foo-git"]]
+        assert {pkg["name"]: pkg["repo"] for pkg in plan["packages"]} == {
+            "curl": "extra", "openssl": "core", "foo-git": "aur", "libfoo": "aur"
+        }
+        assert plan["aur_complete"] is True
+
+    def test_without_aur_names_outside_repos_are_missing(self, planner):
+        aur = FakeAUR({"foo-git": {"Name": "foo-git", "Version": "r1-1"}})
+        plan = planner(aur).plan(["foo-git", "curl"], include_aur=False)
+        assert plan["missing"] == ["foo-git"]
+        assert "aur" not in plan["sources"]
+
+    def test_unreachable_aur_is_not_missing(self, planner):
+        plan = planner().plan(["foo-git"])
+        assert plan["missing"] == []
+        assert plan["aur_complete"] is False
+
+
+class TestCacheManager:
+    @pytest.fixture
+    def cache(self, tmp_path):
+        for name, version, size, mtime in [
+            ("vim", "9.0-1", 100, 1), ("vim", "9.1-1", 100, 2), ("vim", "9.1-2", 100, 3),
+            ("gone", "1.0-1", 50, 1), ("gone", "1.1-1", 50, 2),
+        ]:
+            path = tmp_path / f"{name}-{version}-x86_64.pkg.tar.zst"
+            path.write_bytes(b"x" * size)
+            os.utime(path, (mtime, mtime))
+        (tmp_path / "vim-9.1-2-x86_64.pkg.tar.zst.sig").write_bytes(b"s" * 10)
+        return tmp_path
+
+    @staticmethod
+    def versions(items):
+        return sorted(Path(item["path"]).name.rsplit("-", 1)[0] for item in items)
+
+    def test_keeps_recent_versions_of_installed_packages(self, cache):
+        remove, keep = aur_helper.CacheManager([str(cache)], keep_versions=2).plan({"vim": "9.0-1"})
+        # the installed version is kept on top of the two newest
+        assert self.versions(keep) == ["vim-9.0-1", "vim-9.1-1", "vim-9.1-2"]
+        assert self.versions(remove) == ["gone-1.0-1", "gone-1.1-1"]
+        assert [item["size"] for item in keep if item["signature"]] == [110]
+
+    def test_size_budget_drops_oldest_kept_versions(self, cache):
+        manager = aur_helper.CacheManager([str(cache)], keep_versions=3, keep_uninstalled=1, max_size=220)
+        remove, keep = manager.plan({"vim": "9.1-2"})
+        assert self.versions(keep) == ["gone-1.1-1", "vim-9.1-2"]
+        assert self.versions(remove) == ["gone-1.0-1", "vim-9.0-1", "vim-9.1-1"]
+
+
+class FakeHelper:
+    """just enough of AURHelper for the build scheduler, recording commands instead of running them"""
+
+    def __init__(self, db_path, aur):
+        self.local_db = aur_helper.LocalDatabase(str(db_path))
+        self.sync_index = aur_helper.SyncIndex(str(db_path), str(db_path / "sync_index.json"))
+        self.pacman_conf = aur_helper.PacmanConf(str(db_path / "pacman.conf"))
+        self.aur = aur
+        self.commands = []
+
+    def run_command(self, cmd, capture_output=True):
+        self.commands.append(cmd)
+        return False, ""
+
+
+class UnreachableAUR:
+    def info(self, names, offline=False):
+        return None
+
+
+class TestBuildScheduler:
+    @pytest.fixture
+    def helper(self, tmp_path):
+        def make(aur):
+            write_local(tmp_path, "libfoo", "1.0-1")
+            write_local(tmp_path, "jdk-openjdk", "21-1", provides=["java-runtime=21"])
+            write_sync(tmp_path, "extra", [
+                {"name": "cmake", "version": "3.30-1"},
+                {"name": "pipewire-jack", "version": "1.2-1", "provides": ["jack"]},
+            ])
+            return FakeHelper(tmp_path, aur)
+        return make
+
+    def test_resolve_uses_versions_and_provides(self, helper):
+        aur = FakeAUR({
+            "app": {"Name": "app", "PackageBase": "app",
+                    "Depends": ["libfoo>=2", "java-runtime>=17", "jack"], "MakeDepends": ["cmake"]},
+            "libfoo": {"Name": "libfoo", "PackageBase": "libfoo"},
+        })
+        nodes, repo_deps, missing = aur_helper.BuildScheduler(helper(aur)).resolve(["app"])
+        # the installed libfoo 1.0 is too old, java-runtime>=17 is provided by the installed JDK
+        assert nodes == {"app": {"names": {"app"}, "deps": {"libfoo"}}, "libfoo": {"names": {"libfoo"}, "deps": set()}}
+        assert repo_deps == {"cmake", "pipewire-jack"}
+        assert missing == []
+
+    def test_missing_names_abort_the_build(self, helper):
+        aur = FakeAUR({"app": {"Name": "app", "PackageBase": "app", "Depends": ["java-runtime>=25"]}})
+        fake = helper(aur)
+        scheduler = aur_helper.BuildScheduler(fake)
+        assert scheduler.resolve(["app"])[2] == ["java-runtime"]
+        assert scheduler.build(["app"]) is False
+        assert fake.commands == []
+
+    def test_unreachable_aur_falls_back_to_single_builds(self, helper):
+        fake = helper(UnreachableAUR())
+        scheduler = aur_helper.BuildScheduler(fake)
+        assert scheduler.resolve(["app"]) is None
+        assert scheduler.build(["app"]) is False
+        assert fake.commands[0].startswith("git clone https://aur.archlinux.org/app.git")
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """serves server.resources by path, answering If-None-Match and If-Modified-Since with 304"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        self.server.requests.append({"path": self.path, "headers": dict(self.headers), "client": self.client_address})
+        resource = self.server.resources.get(path)
+        if resource is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        since = self.headers.get("If-Modified-Since")
+        if (resource.get("etag") and self.headers.get("If-None-Match") == resource["etag"]) or (
+                since and resource.get("last_modified")
+                and parsedate_to_datetime(since) >= parsedate_to_datetime(resource["last_modified"])):
+            self.send_response(304)
+            if resource.get("etag"):
+                self.send_header("ETag", resource["etag"])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(resource["body"])))
+        if resource.get("etag"):
+            self.send_header("ETag", resource["etag"])
+        if resource.get("last_modified"):
+            self.send_header("Last-Modified", resource["last_modified"])
+        self.end_headers()
+        self.wfile.write(resource["body"])
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.resources = {}
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestAURClient:
+    @pytest.fixture
+    def client(self, stub_server, tmp_path):
+        stub_server.resources["/rpc/v5/info"] = {
+            "body": json.dumps({"type": "multiinfo", "results": [
+                {"Name": "foo", "Version": "1.0-1"}, {"Name": "bar", "Version": "2.0-1"}
+            ]}).encode(),
+            "etag": '"v1"'
+        }
+
+        def make(ttl=3600):
+            return aur_helper.AURClient(stub_server.url + "/rpc/v5", cache_dir=str(tmp_path / "aur"), ttl=ttl)
+        return make
+
+    def test_fresh_fetch_is_batched(self, client, stub_server):
+        found = client().info(["foo", "bar", "missing"])
+        assert sorted(found) == ["bar", "foo"]
+        assert len(stub_server.requests) == 1
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(stub_server.requests[0]["path"]).query)
+        assert query == {"arg[]": ["bar", "foo", "missing"]}
+
+    def test_served_from_cache_within_ttl(self, client, stub_server):
+        client().info(["foo"])
+        # a new client, so the answer comes from the disk cache
+        assert client().info(["foo"])["foo"]["Version"] == "1.0-1"
+        assert len(stub_server.requests) == 1
+
+    def test_revalidates_with_etag_after_ttl(self, client, stub_server):
+        aur = client(ttl=0)
+        aur.info(["foo"])
+        assert aur.info(["foo"])["foo"]["Version"] == "1.0-1"
+        first, second = stub_server.requests
+        assert "If-None-Match" not in first["headers"]
+        assert second["headers"]["If-None-Match"] == '"v1"'
+        # the keep-alive connection was reused
+        assert first["client"] == second["client"]
+
+    def test_changed_response_replaces_cache(self, client, stub_server):
+        aur = client(ttl=0)
+        aur.info(["foo"])
+        stub_server.resources["/rpc/v5/info"] = {
+            "body": json.dumps({"type": "multiinfo", "results": [{"Name": "foo", "Version": "1.1-1"}]}).encode(),
+            "etag": '"v2"'
+        }
+        assert aur.info(["foo"])["foo"]["Version"] == "1.1-1"
+        assert client().info(["foo"], offline=True)["foo"]["Version"] == "1.1-1"
+
+    def test_offline_fallback(self, client, stub_server):
+        aur = client(ttl=0)
+        aur.info(["foo"])
+        assert aur.info(["foo"], offline=True)["foo"]["Version"] == "1.0-1"
+        assert aur.info(["bar"], offline=True) is None
+        assert len(stub_server.requests) == 1
+
+        # an unreachable AUR falls back to the stale cache
+        aur.close()
+        stub_server.shutdown()
+        stub_server.server_close()
+        assert aur.info(["foo"])["foo"]["Version"] == "1.0-1"
+        assert aur.info(["bar"]) is None
+
+
+class TestSyncRefresher:
+    MODIFIED = 1_700_000_000
+
+    @pytest.fixture
+    def refresher(self, stub_server, tmp_path):
+        (tmp_path / "db" / "sync").mkdir(parents=True)
+        conf = tmp_path / "pacman.conf"
+        conf.write_text("[options]\nArchitecture = x86_64\n[core]\n")
+        stub_server.resources["/core/os/x86_64/core.db"] = {
+            "body": b"core database", "etag": '"core-1"', "last_modified": formatdate(self.MODIFIED, usegmt=True)
+        }
+        stub_server.resources["/core/os/x86_64/core.db.sig"] = {"body": b"core signature"}
+
+        def make():
+            # a new refresher reloads the recorded ETags, like the next update would
+            return aur_helper.SyncRefresher(
+                aur_helper.PacmanConf(str(conf)), str(tmp_path / "db" / "sync"),
+                mirrors=[stub_server.url + "/$repo/os/$arch"], state_file=str(tmp_path / "mirrors.json")
+            )
+        return make
+
+    def test_download(self, refresher, tmp_path):
+        [result] = refresher().refresh()
+        assert result["status"] == "updated"
+        assert result["bytes"] == len(b"core database")
+        sync_dir = tmp_path / "db" / "sync"
+        assert (sync_dir / "core.db").read_bytes() == b"core database"
+        assert (sync_dir / "core.db.sig").read_bytes() == b"core signature"
+        assert (sync_dir / "core.db").stat().st_mtime == self.MODIFIED
+        assert not (tmp_path / "db" / "db.lck").exists()
+
+    def test_unchanged_by_etag(self, refresher, stub_server):
+        refresher().refresh()
+        [result] = refresher().refresh()
+        assert result["status"] == "unchanged"
+        assert stub_server.requests[-1]["headers"]["If-None-Match"] == '"core-1"'
+
+    def test_unchanged_by_modification_time(self, refresher, stub_server):
+        refresher().refresh()
+        del stub_server.resources["/core/os/x86_64/core.db"]["etag"]
+        [result] = refresher().refresh()
+        assert result["status"] == "unchanged"
+        assert parsedate_to_datetime(stub_server.requests[-1]["headers"]["If-Modified-Since"]).timestamp() == self.MODIFIED
+
+    def test_stale_signature_is_removed(self, refresher, stub_server, tmp_path):
+        del stub_server.resources["/core/os/x86_64/core.db.sig"]
+        (tmp_path / "db" / "sync" / "core.db.sig").write_bytes(b"old signature")
+        [result] = refresher().refresh()
+        assert result["status"] == "updated"
+        assert not (tmp_path / "db" / "sync" / "core.db.sig").exists()
+
+    def test_held_lock_skips_refresh(self, refresher, stub_server, tmp_path):
+        (tmp_path / "db" / "db.lck").touch()
+        assert refresher().refresh() is None
+        assert stub_server.requests == []
+        assert (tmp_path / "db" / "db.lck").exists()
+        assert not (tmp_path / "db" / "sync" / "core.db").exists()